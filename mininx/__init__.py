@@ -26,3 +26,6 @@ from mininx.convert import *
 
 import mininx.tree
 from mininx.tree import *
+
+import mininx.algorithms
+from mininx.algorithms import *
@@ -0,0 +1,2 @@
+from mininx.algorithms.dataflow import *
+from mininx.algorithms.link_prediction import *
@@ -0,0 +1,222 @@
+''' Monotone dataflow framework over control-flow graphs
+
+NOTE:
+ - a control-flow graph is a DiGraph whose nodes are basic blocks
+ - lattice values are Python ints used as bitsets; BitIndex gives each fact
+   (variable, definition, expression, ...) a dense bit number
+ - the transfer function of a block is  out = gen | (in & ~kill)
+ - the worklist is a priority queue ordered by reverse postorder of the flow
+   direction, so most blocks are visited after all of their flow predecessors
+ - with sparse=True only blocks whose input differs from the initial value are
+   queued at the start; the result is the same, the work is proportional to
+   the blocks the facts actually reach
+'''
+
+from heapq import heappush, heappop
+
+from mininx.exception import MiniNXError
+
+__all__ = ['BitIndex', 'DataflowProblem', 'DataflowResult', 'solve_dataflow',
+           'reaching_definitions', 'liveness', 'available_expressions']
+
+class BitIndex(object):
+
+    def __init__(self, items=()):
+        self.bit = {}
+        self.items = []
+        for item in items:
+            self.add(item)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, item):
+        return item in self.bit
+
+    def add(self, item):
+        try:
+            return self.bit[item]
+        except KeyError:
+            self.bit[item] = b = len(self.items)
+            self.items.append(item)
+            return b
+
+    @property
+    def full(self):
+        return (1 << len(self.items)) - 1
+
+    def encode(self, items):
+        bits = 0
+        bit = self.bit
+        for item in items:
+            bits |= 1 << bit[item]
+        return bits
+
+    def decode(self, bits):
+        items = self.items
+        result = []
+        while bits:
+            low = bits & -bits
+            result.append(items[low.bit_length() - 1])
+            bits ^= low
+        return result
+
+class DataflowProblem(object):
+
+    def __init__(self, gen, kill, direction='forward', meet='union', boundary=0, top=0):
+        if direction not in ('forward', 'backward'):
+            raise MiniNXError("Unknown dataflow direction: %s" % direction)
+        if meet not in ('union', 'intersection'):
+            raise MiniNXError("Unknown dataflow meet: %s" % meet)
+        self.gen = gen      # block -> bits
+        self.kill = kill    # block -> bits
+        self.direction = direction
+        self.meet = meet
+        self.boundary = boundary
+        self.top = top      # all-facts mask; used by intersection problems
+
+class DataflowResult(object):
+
+    def __init__(self, IN, OUT, index=None):
+        self.IN = IN
+        self.OUT = OUT
+        self.index = index
+
+    def in_set(self, n):
+        return set(self.index.decode(self.IN[n]))
+
+    def out_set(self, n):
+        return set(self.index.decode(self.OUT[n]))
+
+def _reverse_postorder(start, nbrs, nodes):
+    order = []
+    seen = set([start])
+    stack = [(start, iter(nbrs[start]))]
+    while stack:
+        n, children = stack[-1]
+        for c in children:
+            if c not in seen:
+                seen.add(c)
+                stack.append((c, iter(nbrs[c])))
+                break
+        else:
+            stack.pop()
+            order.append(n)
+    order.reverse()
+    # blocks unreachable from start come last, in graph order
+    order.extend(n for n in nodes if n not in seen)
+    return order
+
+def solve_dataflow(G, problem, start, sparse=False):
+    if start not in G:
+        raise MiniNXError("The node %s is not in the graph." % (start,))
+    if problem.direction == 'forward':
+        flow_succ, flow_pred = G.succ, G.pred
+    else:
+        flow_succ, flow_pred = G.pred, G.succ
+
+    order = _reverse_postorder(start, flow_succ, G)
+    rank = dict((n, i) for i, n in enumerate(order))
+
+    gen, kill = problem.gen, problem.kill
+    union = problem.meet == 'union'
+    init = 0 if union else problem.top
+    boundary = problem.boundary
+
+    IN = {}
+    OUT = {}
+    for n in order:
+        IN[n] = init
+        OUT[n] = gen.get(n, 0) | (init & ~kill.get(n, 0))
+
+    if sparse:
+        queued = set([start])
+        for n in order:
+            if OUT[n] != init:
+                queued.update(flow_succ[n])
+    else:
+        queued = set(order)
+    worklist = [rank[n] for n in queued]
+    worklist.sort()
+
+    while worklist:
+        n = order[heappop(worklist)]
+        queued.discard(n)
+
+        preds = flow_pred[n]
+        if n == start:
+            value = boundary
+            for p in preds:
+                value = (value | OUT[p]) if union else (value & OUT[p])
+        elif union:
+            value = 0
+            for p in preds:
+                value |= OUT[p]
+        else:
+            value = problem.top
+            for p in preds:
+                value &= OUT[p]
+        IN[n] = value
+
+        out = gen.get(n, 0) | (value & ~kill.get(n, 0))
+        if out != OUT[n]:
+            OUT[n] = out
+            for s in flow_succ[n]:
+                if s not in queued:
+                    queued.add(s)
+                    heappush(worklist, rank[s])
+
+    if problem.direction == 'backward':
+        # report values in program order: IN before a block, OUT after it
+        IN, OUT = OUT, IN
+    return DataflowResult(IN, OUT)
+
+def reaching_definitions(G, entry, defs, sparse=True):
+    # defs: block -> variables defined in the block
+    index = BitIndex()
+    byvar = {}
+    for n, variables in defs.items():
+        for var in variables:
+            byvar[var] = byvar.get(var, 0) | (1 << index.add((n, var)))
+    gen, kill = {}, {}
+    for n, variables in defs.items():
+        g = index.encode((n, var) for var in variables)
+        gen[n] = g
+        k = 0
+        for var in variables:
+            k |= byvar[var]
+        kill[n] = k & ~g
+    problem = DataflowProblem(gen, kill, 'forward', 'union')
+    result = solve_dataflow(G, problem, entry, sparse=sparse)
+    result.index = index
+    return result
+
+def liveness(G, exit, uses, defs, sparse=True):
+    # uses: block -> variables read before any write in the block
+    # defs: block -> variables written in the block
+    index = BitIndex()
+    for table in (uses, defs):
+        for variables in table.values():
+            for var in variables:
+                index.add(var)
+    gen = dict((n, index.encode(v)) for n, v in uses.items())
+    kill = dict((n, index.encode(v)) for n, v in defs.items())
+    problem = DataflowProblem(gen, kill, 'backward', 'union')
+    result = solve_dataflow(G, problem, exit, sparse=sparse)
+    result.index = index
+    return result
+
+def available_expressions(G, entry, gen, kill, sparse=True):
+    # gen: block -> expressions computed and not killed afterwards in the block
+    # kill: block -> expressions whose operands are redefined in the block
+    index = BitIndex()
+    for table in (gen, kill):
+        for exprs in table.values():
+            for e in exprs:
+                index.add(e)
+    problem = DataflowProblem(dict((n, index.encode(v)) for n, v in gen.items()),
+                              dict((n, index.encode(v)) for n, v in kill.items()),
+                              'forward', 'intersection', boundary=0, top=index.full)
+    result = solve_dataflow(G, problem, entry, sparse=sparse)
+    result.index = index
+    return result
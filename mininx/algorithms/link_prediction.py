@@ -0,0 +1,130 @@
+''' Batched common-neighbor and similarity scores of node pairs
+
+NOTE:
+ - scores are computed on a CSR snapshot of an undirected graph: a dense node
+   index, an indptr array and the sorted neighbor indices of every node; self
+   loops and parallel edges are dropped, so a pair never counts its own nodes
+ - a batch is grouped by its first node; the neighbors of that node are hashed
+   once and intersected in C with the neighbor slice of every partner
+ - scores come back as arrays in the order of the given pairs
+ - top_k_pairs keeps a heap of k pairs; without pairs it walks the sparse
+   product A*A row by row, so only pairs with a common neighbor are visited and
+   no list of all pairs is built
+ - the snapshot does not follow later changes of the graph; take a new one
+'''
+
+from array import array
+from math import log
+from heapq import nlargest
+from itertools import groupby
+from collections import defaultdict
+
+from mininx.exception import MiniNXError
+from mininx.utils import not_implemented_for
+
+__all__ = ['CSRSnapshot', 'csr_snapshot', 'common_neighbor_counts',
+           'jaccard_coefficients', 'adamic_adar_indices', 'top_k_pairs']
+
+class CSRSnapshot(object):
+
+    def __init__(self, G):
+        self.nodes = list(G)
+        self.index = index = dict((n, i) for i, n in enumerate(self.nodes))
+        self.indptr = indptr = array('l', [0])
+        self.indices = indices = array('l')
+        for u in self.nodes:
+            indices.extend(sorted(index[v] for v in G[u] if v != u))
+            indptr.append(len(indices))
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def degree(self, i):
+        return self.indptr[i+1] - self.indptr[i]
+
+    def row(self, i):
+        return self.indices[self.indptr[i]:self.indptr[i+1]]
+
+    def node_index(self, n):
+        try:
+            return self.index[n]
+        except KeyError:
+            raise MiniNXError("The node %s is not in the graph." % (n,))
+
+@not_implemented_for('directed')
+def csr_snapshot(G):
+    return CSRSnapshot(G)
+
+def _intersections(csr, pairs):
+    # yields (position, common neighbor indices) for every pair
+    index = csr.node_index
+    indexed = sorted((index(u), index(v), pos) for pos, (u, v) in enumerate(pairs))
+    for i, group in groupby(indexed, key=lambda item: item[0]):
+        nbrs = set(csr.row(i))
+        for _, j, pos in group:
+            yield pos, nbrs.intersection(csr.row(j))
+
+def _scores(G, pairs, csr, typecode, score):
+    if csr is None:
+        csr = CSRSnapshot(G)
+    pairs = list(pairs)
+    result = array(typecode, [0]) * len(pairs)
+    for pos, common in _intersections(csr, pairs):
+        result[pos] = score(csr, pairs[pos], common)
+    return result
+
+def _count(csr, pair, common):
+    return len(common)
+
+def _jaccard(csr, pair, common):
+    index = csr.index
+    union = csr.degree(index[pair[0]]) + csr.degree(index[pair[1]]) - len(common)
+    return len(common) / float(union) if union else 0.0
+
+def _adamic_adar(csr, pair, common):
+    # only a self pair (u, u) can have a common neighbor of degree 1, whose
+    # log is 0; such neighbors are skipped
+    degree = csr.degree
+    return sum(1.0 / log(d) for d in map(degree, common) if d > 1)
+
+@not_implemented_for('directed')
+def common_neighbor_counts(G, pairs, csr=None):
+    return _scores(G, pairs, csr, 'l', _count)
+
+@not_implemented_for('directed')
+def jaccard_coefficients(G, pairs, csr=None):
+    return _scores(G, pairs, csr, 'd', _jaccard)
+
+@not_implemented_for('directed')
+def adamic_adar_indices(G, pairs, csr=None):
+    return _scores(G, pairs, csr, 'd', _adamic_adar)
+
+SCORES = { 'common_neighbors': _count, 'jaccard': _jaccard, 'adamic_adar': _adamic_adar }
+
+def _two_hop(csr):
+    # rows of A*A above the diagonal: (i, j, common neighbor indices)
+    for i in range(len(csr)):
+        common = defaultdict(list)
+        for w in csr.row(i):
+            for j in csr.row(w):
+                if j > i:
+                    common[j].append(w)
+        for j in sorted(common):
+            yield i, j, common[j]
+
+@not_implemented_for('directed')
+def top_k_pairs(G, k, method='jaccard', pairs=None, csr=None):
+    try:
+        score = SCORES[method]
+    except KeyError:
+        raise MiniNXError("Unknown method %s; use one of %s." % (method, ', '.join(sorted(SCORES))))
+    if csr is None:
+        csr = CSRSnapshot(G)
+    nodes = csr.nodes
+    if pairs is None:
+        candidates = (((nodes[i], nodes[j]), common) for i, j, common in _two_hop(csr))
+    else:
+        pairs = list(pairs)
+        candidates = ((pairs[pos], common) for pos, common in _intersections(csr, pairs))
+    scored = ((score(csr, pair, common), pair) for pair, common in candidates)
+    return [ (u, v, s) for s, (u, v) in nlargest(k, scored, key=lambda item: item[0]) ]
@@ -3,6 +3,11 @@ from .digraph import DiGraph
 from .multigraph import MultiGraph
 from .multidigraph import MultiDiGraph
 from .ordered import *
+from .columnar import *
+from .frozen import *
+from .concurrent import *
+from .interned import *
+from .memory import *
 
 from .function import *
 
@@ -0,0 +1,391 @@
+''' Batched graph edits
+
+NOTE:
+ - "with G.batch():" records the add/remove calls made on G in an edit log
+   instead of applying them; the log is applied when the block ends and
+   discarded when it raises or when rollback() is called, so a batch is all
+   or nothing; once committed or rolled back a batch refuses further edits
+ - edge adds are only appended to a list until another kind of edit needs the
+   log; a batch of edge adds alone is committed with one add_edges_from call
+   on that list, which is faster than adding the edges one by one
+ - everything a commit could fail on (unhashable nodes, bad edge tuples) is
+   checked before the graph is changed
+ - the log keeps only the net change of every node and edge: an edge added and
+   removed again in a batch is never touched, attributes of repeated adds are
+   merged
+ - remove_node/remove_edge of a missing node or edge raises at the call, as it
+   does without a batch; validity is checked against the graph plus the log
+ - on commit node removals, node adds, edge removals and edge adds are each
+   applied with one bulk call; edges are grouped by their first node, except for
+   ordered graphs where they keep the order of the log (a node or edge that is
+   removed and added again in a batch still moves to the end, but the order
+   can differ from the one the edits would give one by one)
+ - reads of G inside the block see the graph before the batch
+ - batches nest: the edits of an inner batch go to the log of the outer batch
+ - only the calls of the thread that entered the batch are recorded; on
+   Concurrent* graphs the batch holds the write lock from enter to commit, so
+   the writes of other threads wait for it and readers never see the graph
+   half way through a commit
+'''
+
+from collections import OrderedDict
+
+try:
+    from thread import get_ident
+except ImportError:
+    from threading import get_ident
+
+from mininx.exception import MiniNXError, MiniNXNotImplemented
+
+__all__ = ['GraphBatch']
+
+MUTATORS = ('add_node', 'add_nodes_from', 'remove_node', 'remove_nodes_from',
+            'add_edge', 'add_edges_from', 'add_weighted_edges_from', 'remove_edge',
+            'remove_edges_from', 'clear')
+
+def _attr_dict(attr_dict, attr):
+    if attr_dict is None:
+        return attr
+    if not hasattr(attr_dict, 'items'):
+        raise MiniNXError("The attr_dict argument must be a dictionary.")
+    attr_dict = dict(attr_dict.items())
+    attr_dict.update(attr)
+    return attr_dict
+
+class GraphBatch(object):
+
+    def __init__(self, G):
+        if G.is_multigraph():
+            raise MiniNXNotImplemented('not implemented for multigraph type')
+        self.G = G
+        self.directed = G.is_directed()
+        self.ordered = isinstance(G.node, OrderedDict)
+        self.cleared = False
+        # OrderedDict is much slower than dict on Python 2; only ordered
+        # graphs need the order of the log
+        log_dict = OrderedDict if self.ordered else dict
+        # node -> [removed first, attributes or None if removed]
+        self.nodes = log_dict()
+        # (u, v) -> [removed first, attributes or None if removed]
+        self.edges = log_dict()
+        # node -> edge keys in self.edges, built at the first remove_node
+        self.incident = None
+        # edge tuples added since the log was last brought up to date
+        self.pending = []
+        self.closed = False
+        self.saved = None
+        self.owner = None
+        self.lock = None
+
+    def __enter__(self):
+        G = self.G
+        self.lock = getattr(G, 'lock', None)   # Concurrent* graphs
+        if self.lock is not None:
+            self.lock.acquire_write()
+        self.owner = get_ident()
+        self.saved = dict((name, G.__dict__[name]) for name in MUTATORS if name in G.__dict__)
+        for name in MUTATORS:
+            setattr(G, name, self._dispatch(name))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self._restore()
+            if self.closed:
+                pass
+            elif exc_type is None:
+                self.commit()
+            else:
+                self.rollback()
+        finally:
+            if self.lock is not None:
+                self.lock, lock = None, self.lock
+                lock.release_write()
+
+    def _dispatch(self, name):
+        # calls of other threads go to the method the graph had before
+        record = getattr(self, name)
+        saved = self._original(name)
+        owner = self.owner
+        if name == 'add_edge':
+            # the bulk of most batches: appended here without another call
+            append = self.pending.append
+            def method(u, v, attr_dict=None, **attr):
+                if get_ident() != owner:
+                    return saved(u, v, attr_dict, **attr)
+                if attr_dict is None and not attr and not self.closed:
+                    append((u, v))
+                else:
+                    record(u, v, attr_dict, **attr)
+        else:
+            def method(*args, **kwargs):
+                if get_ident() == owner:
+                    return record(*args, **kwargs)
+                return saved(*args, **kwargs)
+        method.__name__ = name
+        return method
+
+    def _original(self, name):
+        # the method of G the batch replaces
+        if self.saved is None:
+            return getattr(self.G, name)
+        saved = self.saved.get(name)
+        if saved is not None:
+            return saved
+        return getattr(type(self.G), name).__get__(self.G)
+
+    def _restore(self):
+        if self.saved is None:
+            return
+        G = self.G
+        for name in MUTATORS:
+            if name in self.saved:
+                setattr(G, name, self.saved[name])
+            else:
+                delattr(G, name)
+        self.saved = None
+
+    # views of the graph with the log applied
+
+    def _check_open(self):
+        if self.closed:
+            raise MiniNXError("The batch is already committed or rolled back.")
+
+    def _flush(self):
+        # brings the log up to date with the pending edge adds
+        self._check_open()
+        pending = self.pending
+        if pending:
+            self._check_edges(pending)
+            edges, pending[:] = list(pending), []
+            for e in edges:
+                self._add_edge(e[0], e[1], dict(e[2]) if len(e) == 3 else {})
+
+    def _check_edges(self, edges):
+        for e in edges:
+            if len(e) not in (2, 3):
+                raise MiniNXError("Edge tuple %s must be a 2-tuple or 3-tuple." % (e,))
+            if len(e) == 3 and not hasattr(e[2], 'items'):
+                raise MiniNXError("The edge data of %s must be a dictionary." % (e,))
+            try:
+                hash(e[0]), hash(e[1])
+            except TypeError:
+                raise MiniNXError("The nodes of edge %s must be hashable." % (e,))
+
+    def has_node(self, n):
+        self._flush()
+        entry = self.nodes.get(n)
+        if entry is not None:
+            return entry[1] is not None
+        return not self.cleared and n in self.G.node
+
+    def _key(self, u, v):
+        if not self.directed and (u, v) not in self.edges and (v, u) in self.edges:
+            return (v, u)
+        return (u, v)
+
+    def has_edge(self, u, v):
+        self._flush()
+        entry = self.edges.get(self._key(u, v))
+        if entry is not None:
+            return entry[1] is not None
+        return self._in_graph(u, v)
+
+    def _in_graph(self, u, v):
+        # the edge is in G and no edit so far removed it with a node
+        if self.cleared:
+            return False
+        for n in (u, v):
+            entry = self.nodes.get(n)
+            if entry is not None and entry[0]:
+                return False
+        return self.G.has_edge(u, v)
+
+    # recorded edits
+
+    def add_node(self, n, attr_dict=None, **attr):
+        self._flush()
+        attr_dict = _attr_dict(attr_dict, attr)
+        entry = self.nodes.get(n)
+        if entry is None:
+            self.nodes[n] = [False, dict(attr_dict)]
+        elif entry[1] is None:
+            entry[1] = dict(attr_dict)
+        else:
+            entry[1].update(attr_dict)
+
+    def add_nodes_from(self, nodes, **attr):
+        self._flush()
+        for n in nodes:
+            try:
+                self.add_node(n, **attr)
+            except TypeError:
+                nn, ndict = n
+                self.add_node(nn, ndict, **attr)
+
+    def _index(self, key):
+        incident = self.incident
+        for n in key:
+            if n in incident:
+                incident[n].add(key)
+            else:
+                incident[n] = set([key])
+
+    def _drop_edge(self, key):
+        del self.edges[key]
+        if self.incident is not None:
+            for n in key:
+                keys = self.incident.get(n)
+                if keys is not None:
+                    keys.discard(key)
+
+    def remove_node(self, n):
+        self._flush()
+        if not self.has_node(n):
+            raise MiniNXError("The node %s is not in the graph." % (n,))
+        if self.incident is None:
+            self.incident = {}
+            for key in self.edges:
+                self._index(key)
+        for key in list(self.incident.pop(n, ())):
+            if key in self.edges:
+                self._drop_edge(key)
+        self.nodes[n] = [True, None]
+
+    def remove_nodes_from(self, nodes):
+        self._flush()
+        for n in nodes:
+            if self.has_node(n):
+                self.remove_node(n)
+
+    def add_edge(self, u, v, attr_dict=None, **attr):
+        self._check_open()
+        if attr_dict is not None:
+            attr = _attr_dict(attr_dict, attr)
+        self._check_edges([(u, v)])
+        self.pending.append((u, v, attr))
+
+    def _add_edge(self, u, v, attr):
+        # attr is owned by the log
+        nodes = self.nodes
+        for n in (u, v):
+            entry = nodes.get(n)
+            if entry is None:
+                if self.cleared or n not in self.G.node:
+                    nodes[n] = [False, {}]
+            elif entry[1] is None:
+                entry[1] = {}
+        key = (u, v) if self.directed else self._key(u, v)
+        edges = self.edges
+        entry = edges.get(key)
+        if entry is None:
+            edges[key] = [False, attr]
+            if self.incident is not None:
+                self._index(key)
+        elif entry[1] is None:
+            if self.ordered:
+                # a new edge: it goes after the edges added before it
+                del edges[key]
+            edges[key] = [True, attr]
+        else:
+            entry[1].update(attr)
+
+    def add_edges_from(self, ebunch, attr_dict=None, **attr):
+        self._check_open()
+        attr_dict = _attr_dict(attr_dict, attr)
+        edges = list(ebunch)
+        self._check_edges(edges)
+        # data dicts are copied as the graph would copy them at this call
+        self.pending.extend(e if len(e) == 2 and not attr_dict else
+                            (e[0], e[1], _attr_dict(attr_dict, e[2] if len(e) == 3 else {}))
+                            for e in edges)
+
+    def add_weighted_edges_from(self, ebunch, weight='weight', **attr):
+        self.add_edges_from(((u, v, {weight: d}) for u, v, d in ebunch), **attr)
+
+    def remove_edge(self, u, v):
+        self._flush()
+        if not self.has_edge(u, v):
+            raise MiniNXError("The edge %s-%s is not in the graph" % (u, v))
+        key = self._key(u, v)
+        entry = self.edges.get(key)
+        if entry is None:
+            if self.incident is not None:
+                self._index(key)
+        elif not entry[0] and not self._in_graph(u, v):
+            # added in this batch only
+            self._drop_edge(key)
+            return
+        self.edges[key] = [True, None]
+
+    def remove_edges_from(self, ebunch):
+        self._flush()
+        for e in ebunch:
+            u, v = e[:2]
+            if self.has_edge(u, v):
+                self.remove_edge(u, v)
+
+    def clear(self):
+        self._check_open()
+        del self.pending[:]
+        self.cleared = True
+        self.nodes.clear()
+        self.edges.clear()
+        self.incident = None
+
+    # commit and rollback
+
+    def __len__(self):
+        if not self.closed:
+            self._flush()
+        return len(self.nodes) + len(self.edges) + self.cleared
+
+    def _grouped(self, edges):
+        if self.ordered:
+            return edges
+        groups = {}
+        for e in edges:
+            group = groups.get(e[0])
+            if group is None:
+                groups[e[0]] = [e]
+            else:
+                group.append(e)
+        return [ e for group in groups.values() for e in group ]
+
+    def _apply(self):
+        method = self._original
+        if not (self.cleared or self.nodes or self.edges):
+            # edge adds only: the graph merges them as it would one by one
+            method('add_edges_from')(self.pending)
+            return
+        self._flush()
+        if self.cleared:
+            method('clear')()
+        method('remove_nodes_from')([ n for n, (removed, attrs) in self.nodes.items() if removed ])
+        method('add_nodes_from')([ (n, attrs) for n, (removed, attrs) in self.nodes.items()
+                                   if attrs is not None ])
+        method('remove_edges_from')(self._grouped([ key for key, (removed, attrs) in self.edges.items()
+                                                    if removed ]))
+        method('add_edges_from')(self._grouped([ key + (attrs,) for key, (removed, attrs) in self.edges.items()
+                                                 if attrs is not None ]))
+
+    def commit(self):
+        self._check_open()
+        self._check_edges(self.pending)
+        with self.G.hold_events():
+            try:
+                writing = self.G.writing
+            except AttributeError:
+                self._apply()
+            else:
+                with writing():
+                    self._apply()
+        self.rollback()
+
+    def rollback(self):
+        self.closed = True
+        self.cleared = False
+        del self.pending[:]
+        self.nodes.clear()
+        self.edges.clear()
+        self.incident = None
@@ -0,0 +1,427 @@
+''' Columnar attribute store for graph classes
+
+NOTE:
+ - node and edge attributes of a Columnar* graph live in a ColumnStore: one
+   column per attribute name, indexed by a row id per node or edge
+ - a column is a typed array ('l' for ints, 'd' for floats) until a value of
+   another type or an int too large for 'l' arrives; then it becomes a list
+ - G.node[n] and G[u][v] are AttrRow proxies that behave like dicts; a row is
+   released for reuse when its last proxy is gone
+ - node_column/edge_column gather one attribute of many nodes or edges into an
+   array without building a dict per node or edge; set_node_column and
+   set_edge_column scatter values the same way
+ - subgraphs share the proxies of the original graph as the dict based classes
+   share attribute dicts; copies get a store of their own
+ - freezing keeps the stores: the proxies become FrozenAttrRow in place, so
+   node_column/edge_column still gather from the columns; subgraphs taken
+   before freezing share the proxies and so see them read-only too
+'''
+
+from array import array
+from copy import deepcopy
+from itertools import compress, repeat
+from collections import OrderedDict, deque
+
+from .graph import Graph
+from .digraph import DiGraph
+from .multigraph import MultiGraph
+from .multidigraph import MultiDiGraph
+from mininx.exception import MiniNXError
+import mininx.convert as convert
+
+__all__ = ['ColumnStore', 'AttrRow', 'FrozenAttrRow', 'ColumnarGraph', 'ColumnarDiGraph',
+           'ColumnarMultiGraph', 'ColumnarMultiDiGraph']
+
+try:
+    INT_TYPES = (int, long)
+except NameError:
+    INT_TYPES = (int,)
+
+def _kind(value):
+    # typecode of the array that can hold value, None for a list
+    t = type(value)
+    if t is float:
+        return 'd'
+    if t in INT_TYPES:
+        return 'l'
+    return None
+
+def _consume(iterator):
+    deque(iterator, maxlen=0)
+
+class Column(object):
+    __slots__ = ('kind', 'data', 'present')
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.data = array(kind) if kind else []
+        self.present = bytearray()
+
+    def __getstate__(self):
+        return self.kind, self.data, self.present
+
+    def __setstate__(self, state):
+        self.kind, self.data, self.present = state
+
+    def has(self, row):
+        return row < len(self.present) and self.present[row]
+
+    def grow(self, nrows):
+        size = len(self.present)
+        if nrows <= size:
+            return
+        extra = max(nrows, 2 * size) - size
+        self.present.extend(bytearray(extra))
+        if self.kind:
+            self.data.extend(array(self.kind, [0]) * extra)
+        else:
+            self.data.extend([None] * extra)
+
+    def widen(self):
+        # values come back with the type they were stored with, so a
+        # column of mixed types becomes a list
+        if self.kind:
+            self.data = [ value if flag else None for value, flag in zip(self.data, self.present) ]
+            self.kind = None
+
+    def accepts(self, kind):
+        return self.kind is None or kind == self.kind
+
+    def set(self, row, value):
+        self.grow(row + 1)
+        if not self.accepts(_kind(value)):
+            self.widen()
+        try:
+            self.data[row] = value
+        except OverflowError:
+            self.widen()
+            self.data[row] = value
+        self.present[row] = 1
+
+    def clear(self, row):
+        if row < len(self.present):
+            self.present[row] = 0
+            if not self.kind:
+                self.data[row] = None
+
+    def gather(self, rows, default):
+        self.grow(max(rows) + 1 if rows else 0)
+        flags = bytearray(map(self.present.__getitem__, rows))
+        values = map(self.data.__getitem__, rows)
+        missing = flags.count(b'\x00')
+        if self.kind and (not missing or self.accepts(_kind(default))):
+            values = array(self.kind, values)
+        else:
+            values = list(values)
+        if missing:
+            for pos in [ i for i, flag in enumerate(flags) if not flag ]:
+                values[pos] = default
+        return values, flags
+
+    def scatter(self, rows, values):
+        # values is a list aligned with rows
+        self.grow(max(rows) + 1 if rows else 0)
+        if not all(map(self.accepts, set(map(_kind, values)))):
+            self.widen()
+        try:
+            _consume(map(self.data.__setitem__, rows, values))
+        except OverflowError:
+            self.widen()
+            _consume(map(self.data.__setitem__, rows, values))
+        _consume(map(self.present.__setitem__, rows, repeat(1, len(rows))))
+
+class ColumnStore(object):
+
+    def __init__(self):
+        self.columns = OrderedDict()
+        self.nrows = 0
+        self.free = []
+
+    def new_row(self):
+        if self.free:
+            rowid = self.free.pop()
+        else:
+            rowid = self.nrows
+            self.nrows += 1
+        return AttrRow(self, rowid)
+
+    def row(self, data):
+        # a row holding data; proxies are kept so that they stay shared
+        if isinstance(data, AttrRow):
+            return data
+        row = self.new_row()
+        row.update(data)
+        return row
+
+    def release(self, rowid):
+        for column in self.columns.values():
+            column.clear(rowid)
+        self.free.append(rowid)
+
+    def column(self, name, value):
+        column = self.columns.get(name)
+        if column is None:
+            column = self.columns[name] = Column(_kind(value))
+        return column
+
+    def gather(self, rows, name, default=None):
+        # returns (values, presence flags) of name aligned with rows
+        if any(getattr(row, 'store', None) is not self for row in rows):
+            return ([ row.get(name, default) for row in rows ],
+                    bytearray(name in row for row in rows))
+        column = self.columns.get(name)
+        if column is None:
+            return [default] * len(rows), bytearray(len(rows))
+        return column.gather([ row.rowid for row in rows ], default)
+
+    def scatter(self, rows, name, values):
+        values = list(values)
+        if len(values) != len(rows):
+            raise MiniNXError("Got %d values for %d rows." % (len(values), len(rows)))
+        if not rows:
+            return
+        if any(getattr(row, 'store', None) is not self for row in rows):
+            for row, value in zip(rows, values):
+                row[name] = value
+            return
+        self.column(name, values[0]).scatter([ row.rowid for row in rows ], values)
+
+class AttrRow(object):
+    __slots__ = ('store', 'rowid')
+    __hash__ = None
+
+    def __init__(self, store, rowid):
+        self.store = store
+        self.rowid = rowid
+
+    def __getstate__(self):
+        return self.store, self.rowid
+
+    def __setstate__(self, state):
+        self.store, self.rowid = state
+
+    def __del__(self):
+        try:
+            self.store.release(self.rowid)
+        except (AttributeError, TypeError):
+            pass    # interpreter shutdown
+
+    def __getitem__(self, key):
+        column = self.store.columns.get(key)
+        if column is None or not column.has(self.rowid):
+            raise KeyError(key)
+        return column.data[self.rowid]
+
+    def __setitem__(self, key, value):
+        self.store.column(key, value).set(self.rowid, value)
+
+    def __delitem__(self, key):
+        column = self.store.columns.get(key)
+        if column is None or not column.has(self.rowid):
+            raise KeyError(key)
+        column.clear(self.rowid)
+
+    def __contains__(self, key):
+        column = self.store.columns.get(key)
+        return column is not None and column.has(self.rowid)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __eq__(self, other):
+        try:
+            return dict(self.items()) == dict(other.items())
+        except AttributeError:
+            return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def __deepcopy__(self, memo):
+        # rows of a copied store stay rows; any other copy is a plain dict
+        store = memo.get(id(self.store))
+        if store is not None:
+            return AttrRow(store, self.rowid)
+        return deepcopy(dict(self.items()), memo)
+
+    def __copy__(self):
+        return dict(self.items())
+
+    def keys(self):
+        rowid = self.rowid
+        return [ name for name, column in self.store.columns.items() if column.has(rowid) ]
+
+    def values(self):
+        return [ self[key] for key in self.keys() ]
+
+    def items(self):
+        return [ (key, self[key]) for key in self.keys() ]
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self, key, *default):
+        try:
+            value = self[key]
+        except KeyError:
+            if default:
+                return default[0]
+            raise
+        del self[key]
+        return value
+
+    def update(self, other=(), **attr):
+        items = other.items() if hasattr(other, 'items') else other
+        for key, value in items:
+            self[key] = value
+        for key, value in attr.items():
+            self[key] = value
+
+    def clear(self):
+        for key in self.keys():
+            del self[key]
+
+    def copy(self):
+        return dict(self.items())
+
+class FrozenAttrRow(AttrRow):
+    # the rows of a frozen graph; same layout, so freezing swaps the class
+    __slots__ = ()
+
+    def _readonly(self, *args, **kwargs):
+        raise MiniNXError("Frozen graph can't be modified")
+
+    __setitem__ = __delitem__ = setdefault = pop = update = clear = _readonly
+
+def freeze_row(row):
+    if type(row) is AttrRow:
+        row.__class__ = FrozenAttrRow
+    return row
+
+class NodeTable(dict):
+    # node -> AttrRow; plain attribute dicts are moved into the store
+
+    def __init__(self, store):
+        dict.__init__(self)
+        self.store = store
+
+    def __setitem__(self, n, data):
+        dict.__setitem__(self, n, self.store.row(data))
+
+    def __reduce__(self):
+        return (self.__class__, (self.store,), None, None, iter(self.items()))
+
+    def __deepcopy__(self, memo):
+        table = self.__class__(deepcopy(self.store, memo))
+        memo[id(self)] = table
+        for n, row in self.items():
+            dict.__setitem__(table, deepcopy(n, memo), deepcopy(row, memo))
+        return table
+
+class ColumnarMixin(object):
+
+    def __init__(self, data=None, **attr):
+        self.node_store = ColumnStore()
+        self.edge_store = ColumnStore()
+        super(ColumnarMixin, self).__init__(**attr)
+        self.edge_attr_dict_factory = self.edge_store.new_row
+        self.node = NodeTable(self.node_store)
+        if data is not None:
+            convert.to_networkx_graph(data, create_using=self)
+            self.graph.update(attr)
+
+    def __deepcopy__(self, memo):
+        H = self.__class__.__new__(self.__class__)
+        memo[id(self)] = H
+        # stores first so that the rows find their copied store
+        H.node_store = deepcopy(self.node_store, memo)
+        H.edge_store = deepcopy(self.edge_store, memo)
+        for name, value in self.__dict__.items():
+            if name not in ('node_store', 'edge_store', 'edge_attr_dict_factory'):
+                setattr(H, name, deepcopy(value, memo))
+        H.edge_attr_dict_factory = H.edge_store.new_row
+        return H
+
+    def __getstate__(self):
+        # the bound method factory does not pickle; it is rebuilt from the store
+        state = self.__dict__.copy()
+        del state['edge_attr_dict_factory']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.edge_attr_dict_factory = self.edge_store.new_row
+
+    def _edge_rows(self, edges):
+        if edges is None:
+            if self.is_multigraph():
+                edges = list(self.edges(keys=True, data=True))
+            else:
+                edges = list(self.edges(data=True))
+            return [ e[:-1] for e in edges ], [ e[-1] for e in edges ]
+        edges = list(edges)
+        rows = []
+        for e in edges:
+            row = self.get_edge_data(*e)
+            if row is None or (self.is_multigraph() and len(e) == 2):
+                raise MiniNXError("The edge %s is not in the graph." % (e,))
+            rows.append(row)
+        return edges, rows
+
+    def node_column(self, name, nodes=None, default=None):
+        if nodes is None:
+            rows = list(self.node.values())
+        else:
+            rows = [ self.node[n] for n in nodes ]
+        return self.node_store.gather(rows, name, default)[0]
+
+    def set_node_column(self, name, values, nodes=None):
+        if nodes is None:
+            rows = list(self.node.values())
+        else:
+            rows = [ self.node[n] for n in nodes ]
+        self.node_store.scatter(rows, name, values)
+
+    def node_attributes(self, name):
+        values, flags = self.node_store.gather(list(self.node.values()), name)
+        return dict(compress(zip(self.node, values), flags))
+
+    def edge_column(self, name, edges=None, default=None):
+        edges, rows = self._edge_rows(edges)
+        return self.edge_store.gather(rows, name, default)[0]
+
+    def set_edge_column(self, name, values, edges=None):
+        edges, rows = self._edge_rows(edges)
+        self.edge_store.scatter(rows, name, values)
+
+    def edge_attributes(self, name):
+        edges, rows = self._edge_rows(None)
+        values, flags = self.edge_store.gather(rows, name)
+        return dict(compress(zip(edges, values), flags))
+
+class ColumnarGraph(ColumnarMixin, Graph):
+    pass
+
+class ColumnarDiGraph(ColumnarMixin, DiGraph):
+    pass
+
+class ColumnarMultiGraph(ColumnarMixin, MultiGraph):
+    pass
+
+class ColumnarMultiDiGraph(ColumnarMixin, MultiDiGraph):
+    pass
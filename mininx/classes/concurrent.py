@@ -0,0 +1,197 @@
+''' Graphs for concurrent readers and writers
+
+NOTE:
+ - Concurrent* graphs guard their mutating methods with the write side of a
+   readers-writer lock, so an edge is never seen in succ but not yet in pred
+ - readers hold the read side with "with G.reading():" for as long as they walk
+   the graph, including the generators returned by edges(), nodes(), ...;
+   readers do not block one another, waiting writers go first
+ - each write advances G.epoch; G.snapshot() returns a frozen copy of the graph
+   of the current epoch, built once per epoch and shared by all readers, so a
+   long analysis can run on a consistent graph without holding the lock
+ - the lock is reentrant for the writer and for readers; a reader can not
+   become a writer while holding the read side
+ - writes made directly to G.node, G.adj, G.succ, G.pred or G.graph bypass the
+   lock and are not seen by snapshot() until the next locked write
+'''
+
+import threading
+from contextlib import contextmanager
+
+from .graph import Graph
+from .digraph import DiGraph
+from .multigraph import MultiGraph
+from .multidigraph import MultiDiGraph
+from .frozen import freeze_graph
+from mininx.exception import MiniNXError
+
+__all__ = ['RWLock', 'ConcurrentGraph', 'ConcurrentDiGraph', 'ConcurrentMultiGraph',
+           'ConcurrentMultiDiGraph']
+
+MUTATORS = ('add_node', 'add_nodes_from', 'remove_node', 'remove_nodes_from',
+            'add_edge', 'add_edges_from', 'add_weighted_edges_from', 'remove_edge',
+            'remove_edges_from', 'clear')
+
+class RWLock(object):
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._writes = 0
+        self._waiting = 0
+        self._local = threading.local()
+
+    def _read_depth(self):
+        return getattr(self._local, 'depth', 0)
+
+    def acquire_read(self):
+        depth = self._read_depth()
+        if depth or self._writer is threading.current_thread():
+            self._local.depth = depth + 1
+            return
+        with self._cond:
+            while self._writer is not None or self._waiting:
+                self._cond.wait()
+            self._readers += 1
+        self._local.depth = 1
+
+    def release_read(self):
+        depth = self._read_depth() - 1
+        self._local.depth = depth
+        if depth or self._writer is threading.current_thread():
+            return
+        with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        me = threading.current_thread()
+        if self._writer is me:
+            self._writes += 1
+            return
+        if self._read_depth():
+            raise MiniNXError("A reader can not acquire the write lock.")
+        with self._cond:
+            self._waiting += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting -= 1
+            self._writer = me
+            self._writes = 1
+
+    def release_write(self):
+        if self._writer is not threading.current_thread():
+            raise MiniNXError("The write lock is not held by this thread.")
+        self._writes -= 1
+        if self._writes:
+            return
+        with self._cond:
+            self._writer = None
+            self._cond.notify_all()
+
+    @contextmanager
+    def read(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+def _locked(name):
+    def method(self, *args, **kwargs):
+        lock = self.lock
+        lock.acquire_write()
+        try:
+            return getattr(super(ConcurrentMixin, self), name)(*args, **kwargs)
+        finally:
+            self.epoch += 1
+            lock.release_write()
+    method.__name__ = name
+    return method
+
+class ConcurrentMixin(object):
+
+    def __init__(self, data=None, **attr):
+        self.lock = RWLock()
+        self.epoch = 0
+        self._snapshot = None
+        super(ConcurrentMixin, self).__init__(data, **attr)
+
+    @contextmanager
+    def reading(self):
+        self.lock.acquire_read()
+        try:
+            yield self
+        finally:
+            self.lock.release_read()
+
+    @contextmanager
+    def writing(self):
+        # a block of writes that readers see as one change
+        self.lock.acquire_write()
+        try:
+            yield self
+        finally:
+            self.epoch += 1
+            self.lock.release_write()
+
+    def _plain_class(self):
+        for cls in type(self).__mro__:
+            if not issubclass(cls, ConcurrentMixin):
+                return cls
+
+    def snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot[0] == self.epoch:
+            return snapshot[1]
+        with self.reading():
+            epoch = self.epoch
+            frozen = freeze_graph(self._plain_class()(self))
+        self._snapshot = (epoch, frozen)
+        return frozen
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['lock']
+        state['_snapshot'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = RWLock()
+
+    def __deepcopy__(self, memo):
+        from copy import deepcopy
+        with self.reading():
+            H = self.__class__.__new__(self.__class__)
+            memo[id(self)] = H
+            H.__setstate__(deepcopy(self.__getstate__(), memo))
+        return H
+
+for _name in MUTATORS:
+    setattr(ConcurrentMixin, _name, _locked(_name))
+del _name
+
+class ConcurrentGraph(ConcurrentMixin, Graph):
+    pass
+
+class ConcurrentDiGraph(ConcurrentMixin, DiGraph):
+    pass
+
+class ConcurrentMultiGraph(ConcurrentMixin, MultiGraph):
+    pass
+
+class ConcurrentMultiDiGraph(ConcurrentMixin, MultiDiGraph):
+    pass
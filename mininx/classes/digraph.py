@@ -1,3 +1,5 @@
+from copy import deepcopy
+
 from mininx.classes.graph import Graph
 from mininx.exception import MiniNXError
 import mininx.convert as convert
@@ -128,7 +130,10 @@ class DiGraph(Graph):
             except AttributeError:
                 raise MiniNXError(\
                     "The attr_dict argument must be a dict.")
-        # process ebunch
+        # process ebunch; storage and factories are looked up once
+        succ, pred, node = self.succ, self.pred, self.node
+        adjlist_factory = self.adjlist_dict_factory
+        edge_factory = self.edge_attr_dict_factory
         for e in ebunch:
             ne = len(e)
             if ne==3:
@@ -136,23 +141,28 @@ class DiGraph(Graph):
                 assert hasattr(dd,"update")
             elif ne==2:
                 u,v = e
-                dd = {}
+                dd = None
             else:
                 raise MiniNXError(\
                     "Edge tuple %s must be a 2-tuple or 3-tuple."%(e,))
-            if u not in self.succ:
-                self.succ[u] = self.adjlist_dict_factory()
-                self.pred[u] = self.adjlist_dict_factory()
-                self.node[u] = {}
-            if v not in self.succ:
-                self.succ[v] = self.adjlist_dict_factory()
-                self.pred[v] = self.adjlist_dict_factory()
-                self.node[v] = {}
-            datadict=self.adj[u].get(v,self.edge_attr_dict_factory())
-            datadict.update(attr_dict)
-            datadict.update(dd)
-            self.succ[u][v] = datadict
-            self.pred[v][u] = datadict
+            if u not in succ:
+                succ[u] = adjlist_factory()
+                pred[u] = adjlist_factory()
+                node[u] = {}
+            if v not in succ:
+                succ[v] = adjlist_factory()
+                pred[v] = adjlist_factory()
+                node[v] = {}
+            succ_u = succ[u]
+            datadict = succ_u.get(v)
+            if datadict is None:
+                datadict = edge_factory()
+                succ_u[v] = datadict
+                pred[v][u] = datadict
+            if attr_dict:
+                datadict.update(attr_dict)
+            if dd:
+                datadict.update(dd)
 
     def remove_edge(self, u, v):
         try:
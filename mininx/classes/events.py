@@ -0,0 +1,346 @@
+''' Change notification for graphs and trees
+
+NOTE:
+ - G.subscribe(listener) switches G to an observed subclass of its class whose
+   mutating methods report what they changed; G.unsubscribe(listener) of the
+   last listener switches it back, so a graph without listeners runs the plain
+   methods and pays nothing
+ - a listener is called as listener(G, event) once per event, or with
+   batched=True as listener(G, events) once per mutating call with the list of
+   its events; inside "with G.hold_events():" (and for the commit of a
+   G.batch()) all events are delivered when the block ends
+ - events are tuples:
+     ('node_added', n) ('node_updated', n) ('node_removed', n)
+     ('edge_added', u, v) ('edge_updated', u, v) ('edge_removed', u, v)
+     ('cleared',)
+   edges of multigraphs carry their key: ('edge_added', u, v, key)
+ - removing a node reports the removal of its edges first; a node added by
+   add_edge is reported before the edge; only the outermost mutating call
+   reports, so the events of a call are never repeated by the calls it makes
+ - Tree reports the graph events of a subnode edit followed by
+   ('inserted', subnode, parent, index), ('cut', subnode, parent, removed) or
+   ('set', subnode, parent), the Inserted/CutDone/SetDone of the design notes
+ - events are worked out by comparing the touched nodes and edges before and
+   after the call, so a call that raises half way still reports what it did
+ - writes made directly to G.node, G.adj, ... and attribute dicts changed in
+   place are not reported; copies and pickles of an observed graph have no
+   listeners
+'''
+
+from contextlib import contextmanager
+
+from mininx.exception import MiniNXError
+
+__all__ = ['subscribe', 'unsubscribe', 'hold_events', 'observed_class']
+
+class EventHub(object):
+
+    def __init__(self, cls):
+        self.cls = cls # class of the graph before the first subscribe
+        self.listeners = []
+        self.depth = 0
+        self.held = 0
+        self.queue = []
+
+    def deliver(self, G, events):
+        if not events:
+            return
+        if self.held:
+            self.queue.extend(events)
+            return
+        for listener, batched in list(self.listeners):
+            if batched:
+                listener(G, list(events))
+            else:
+                for event in events:
+                    listener(G, event)
+
+# what a call touches: (args, nodes, (u, v) pairs, updates)
+
+def _node_key(G, n):
+    # items of add_nodes_from are nodes or (node, attr dict) tuples
+    try:
+        n in G.node
+        return n
+    except TypeError:
+        return n[0]
+
+def _incident(G, n):
+    if n not in G.node:
+        return []
+    if G.is_directed():
+        return [ (n, v) for v in G.succ[n] ] + [ (u, n) for u in G.pred[n] ]
+    return [ (n, v) for v in G.adj[n] ]
+
+def _edge_key(G, e, args=None, kwargs=None):
+    # key of a multigraph edge tuple or add_edge call, None if not given
+    if not G.is_multigraph():
+        return None
+    if args is not None:
+        return args[2] if len(args) > 2 else kwargs.get('key')
+    return e[2] if len(e) == 4 else None
+
+def _edge_updates(G, edges):
+    updates = []
+    for u, v, key in edges:
+        if not G.is_multigraph():
+            updates.append(('edge', u, v))
+        elif key is not None:
+            updates.append(('edge', u, v, key))
+    return updates
+
+def _add_node(G, args, kwargs):
+    n = args[0]
+    return args, [n], [], [('node', n)]
+
+def _add_nodes_from(G, args, kwargs):
+    items = list(args[0])
+    nodes = [ _node_key(G, n) for n in items ]
+    return (items,) + args[1:], nodes, [], [ ('node', n) for n in nodes ]
+
+def _remove_node(G, args, kwargs):
+    return args, [args[0]], _incident(G, args[0]), []
+
+def _remove_nodes_from(G, args, kwargs):
+    items = list(args[0])
+    return (items,) + args[1:], items, [ e for n in set(items) for e in _incident(G, n) ], []
+
+def _add_edge(G, args, kwargs):
+    u, v = args[:2]
+    return args, [u, v], [(u, v)], _edge_updates(G, [(u, v, _edge_key(G, None, args, kwargs))])
+
+def _add_edges_from(G, args, kwargs):
+    items = list(args[0])
+    pairs = [ tuple(e[:2]) for e in items ]
+    edges = [ (e[0], e[1], _edge_key(G, e)) for e in items ]
+    return ((items,) + args[1:], [ n for e in pairs for n in e ], pairs,
+            _edge_updates(G, edges))
+
+def _add_weighted_edges_from(G, args, kwargs):
+    items = list(args[0])
+    pairs = [ tuple(e[:2]) for e in items ]
+    return ((items,) + args[1:], [ n for e in pairs for n in e ], pairs,
+            _edge_updates(G, [ (u, v, None) for u, v in pairs ]))
+
+def _remove_edge(G, args, kwargs):
+    return args, [], [tuple(args[:2])], []
+
+def _remove_edges_from(G, args, kwargs):
+    items = list(args[0])
+    return (items,) + args[1:], [], [ tuple(e[:2]) for e in items ], []
+
+def _subnode_edit(G, args, kwargs):
+    subnode, parent = args[:2]
+    return args, [subnode], [(parent, subnode)], [('node', subnode)]
+
+def _insert_subnode(G, args, kwargs):
+    subnode, parent = args[1:3]
+    return args, [subnode], [(parent, subnode)], [('node', subnode)]
+
+def _remove_subnode(G, args, kwargs):
+    subnode, parent = args[:2]
+    nodes = list(G.preorder(subnode)) if subnode in G.succ else []
+    pairs = [(parent, subnode)] + [ (u, v) for u in nodes for v in G.succ[u] ]
+    return args, nodes, pairs, []
+
+TOUCHED = { 'add_node': _add_node, 'add_nodes_from': _add_nodes_from,
+    'remove_node': _remove_node, 'remove_nodes_from': _remove_nodes_from,
+    'add_edge': _add_edge, 'add_edges_from': _add_edges_from,
+    'add_weighted_edges_from': _add_weighted_edges_from, 'remove_edge': _remove_edge,
+    'remove_edges_from': _remove_edges_from, 'append_subnode': _subnode_edit,
+    'insert_subnode': _insert_subnode, 'remove_subnode': _remove_subnode,
+    'update_subnode': _subnode_edit }
+
+TREE_EDITS = ('append_subnode', 'insert_subnode', 'remove_subnode', 'update_subnode')
+
+def _tree_event(G, name, args, result):
+    if name == 'remove_subnode':
+        return ('cut', args[0], args[1], result)
+    if name == 'update_subnode':
+        return ('set', args[0], args[1])
+    subnode, parent = args[1:3] if name == 'insert_subnode' else args[:2]
+    return ('inserted', subnode, parent, G.index_subnode(subnode, parent))
+
+def _state(G, nodes, pairs):
+    node, adj = G.node, G.adj
+    multi = G.is_multigraph()
+    nstate = []
+    for n in nodes:
+        try:
+            nstate.append(n in node)
+        except TypeError: # unhashable; the call itself reports it
+            nstate.append(False)
+    pstate = []
+    for u, v in pairs:
+        try:
+            d = adj[u][v]
+        except (KeyError, TypeError):
+            d = None
+        if multi:
+            pstate.append(frozenset(d) if d is not None else frozenset())
+        else:
+            pstate.append(d is not None)
+    return nstate, pstate
+
+def _diff(G, nodes, pairs, updates, before, after):
+    directed = G.is_directed()
+    added, updated, removed = [], [], []
+    seen = set()
+    for n, was, now in zip(nodes, before[0], after[0]):
+        if n in seen:
+            continue
+        seen.add(n)
+        if now and not was:
+            added.append(('node_added', n))
+        elif was and not now:
+            removed.append(('node_removed', n))
+        elif now and ('node', n) in updates:
+            updated.append(('node_updated', n))
+    edges_removed, edges_added, edges_updated = [], [], []
+    seen = set()
+    for (u, v), was, now in zip(pairs, before[1], after[1]):
+        if (u, v) in seen:
+            continue
+        seen.add((u, v))
+        if not directed:
+            seen.add((v, u))
+        if G.is_multigraph():
+            edges_removed.extend(('edge_removed', u, v, k) for k in was - now)
+            edges_added.extend(('edge_added', u, v, k) for k in now - was)
+            edges_updated.extend(('edge_updated', u, v, k) for k in now & was
+                                 if ('edge', u, v, k) in updates)
+        elif now and not was:
+            edges_added.append(('edge_added', u, v))
+        elif was and not now:
+            edges_removed.append(('edge_removed', u, v))
+        elif now and ('edge', u, v) in updates:
+            edges_updated.append(('edge_updated', u, v))
+    return added + edges_removed + edges_added + edges_updated + updated + removed
+
+def _observed(name):
+    touched = TOUCHED[name]
+    def method(self, *args, **kwargs):
+        plain = getattr(super(ObservedMixin, self), name)
+        hub = self._events
+        if hub.depth:
+            return plain(*args, **kwargs)
+        lock = getattr(self, 'lock', None)  # Concurrent* graphs
+        if lock is not None:
+            lock.acquire_write()
+        events = []
+        try:
+            args, nodes, pairs, updates = touched(self, args, kwargs)
+            updates = set(updates)
+            before = _state(self, nodes, pairs)
+            hub.depth += 1
+            try:
+                result = plain(*args, **kwargs)
+            finally:
+                hub.depth -= 1
+                events = _diff(self, nodes, pairs, updates, before, _state(self, nodes, pairs))
+            if name in TREE_EDITS:
+                events.append(_tree_event(self, name, args, result))
+        finally:
+            if lock is not None:
+                lock.release_write()
+            hub.deliver(self, events)
+        return result
+    method.__name__ = name
+    return method
+
+def _observed_clear(self):
+    hub = self._events
+    if hub.depth:
+        return super(ObservedMixin, self).clear()
+    hub.depth += 1
+    try:
+        super(ObservedMixin, self).clear()
+    finally:
+        hub.depth -= 1
+    hub.deliver(self, [('cleared',)])
+
+class ObservedMixin(object):
+
+    def __reduce__(self):
+        getstate = getattr(super(ObservedMixin, self), '__getstate__', None)
+        state = dict(getstate() if getstate is not None else self.__dict__)
+        state.pop('_events', None)
+        return (_unpickle_observed, (self._events.cls, state))
+
+    def __deepcopy__(self, memo):
+        # a copy of the graph as it would be without listeners
+        from copy import deepcopy
+        hub = self.__dict__.pop('_events')
+        cls = self.__class__
+        self.__class__ = hub.cls
+        try:
+            return deepcopy(self, memo)
+        finally:
+            self.__class__ = cls
+            self._events = hub
+
+    def __copy__(self):
+        from copy import copy
+        hub = self.__dict__.pop('_events')
+        cls = self.__class__
+        self.__class__ = hub.cls
+        try:
+            return copy(self)
+        finally:
+            self.__class__ = cls
+            self._events = hub
+
+def _unpickle_observed(cls, state):
+    G = cls.__new__(cls)
+    if hasattr(G, '__setstate__'):
+        G.__setstate__(state)
+    else:
+        G.__dict__.update(state)
+    return G
+
+_OBSERVED_CLASSES = {}
+
+def observed_class(cls):
+    if issubclass(cls, ObservedMixin):
+        return cls
+    try:
+        return _OBSERVED_CLASSES[cls]
+    except KeyError:
+        attrs = dict((name, _observed(name)) for name in TOUCHED if hasattr(cls, name))
+        attrs['clear'] = _observed_clear
+        observed = type('Observed%s' % cls.__name__, (ObservedMixin, cls), attrs)
+        _OBSERVED_CLASSES[cls] = observed
+        return observed
+
+def subscribe(G, listener, batched=False):
+    hub = G.__dict__.get('_events')
+    if hub is None:
+        hub = EventHub(G.__class__)
+        G._events = hub
+        G.__class__ = observed_class(G.__class__)
+    hub.listeners.append((listener, batched))
+
+def unsubscribe(G, listener):
+    hub = G.__dict__.get('_events')
+    entries = [ entry for entry in hub.listeners if entry[0] == listener ] if hub else []
+    if not entries:
+        raise MiniNXError("%r is not subscribed to the graph." % (listener,))
+    hub.listeners.remove(entries[0])
+    if not hub.listeners and G.__class__ is _OBSERVED_CLASSES.get(hub.cls) and not hub.depth:
+        G.__class__ = hub.cls
+        del G._events
+
+@contextmanager
+def hold_events(G):
+    hub = G.__dict__.get('_events')
+    if hub is None:
+        yield G
+        return
+    hub.held += 1
+    try:
+        yield G
+    finally:
+        hub.held -= 1
+        if not hub.held:
+            events, hub.queue = hub.queue, []
+            hub.deliver(G, events)
@@ -0,0 +1,246 @@
+''' Frozen graphs
+
+NOTE:
+ - freeze(G) turns G into an instance of a frozen subclass of its class: the
+   methods that change a graph raise MiniNXError, and the graph, node,
+   adjacency and edge attribute dicts are replaced by read-only dicts
+ - the read-only dicts are dict (or OrderedDict) subclasses, so reading a
+   frozen graph does the same C dict lookups as reading the mutable one;
+   attribute dicts that were shared stay shared
+ - a frozen graph never changes, so copy() and deepcopy return the graph itself;
+   copy(with_data=False) gives a mutable graph of the same structure
+   and it can be read by many threads without locks; forked worker processes
+   see it without copying anything (on Python 3.7+, calling gc.freeze() before
+   forking also keeps the garbage collector from writing to its pages)
+ - hash() is a structural hash of nodes, edges and attributes, computed once;
+   == compares the structure of two frozen graphs
+ - the graph type constructors (e.g. Graph(G)) give a mutable copy
+'''
+
+from types import MethodType
+from collections import OrderedDict
+
+from mininx.exception import MiniNXError
+
+__all__ = ['FrozenDict', 'FrozenOrderedDict', 'FrozenGraphMixin', 'freeze_graph',
+           'frozen_class']
+
+MUTATORS = ('add_node', 'add_nodes_from', 'remove_node', 'remove_nodes_from',
+            'add_edge', 'add_edges_from', 'add_weighted_edges_from', 'remove_edge',
+            'remove_edges_from', 'clear', 'append_subnode', 'insert_subnode',
+            'remove_subnode', 'update_subnode', 'intern', 'unshare', 'unshare_path', 'seal',
+            'set_node_column', 'set_edge_column', 'add_edge_by_id', 'remove_edge_by_id')
+
+def _readonly(*args, **kwargs):
+    raise MiniNXError("Frozen graph can't be modified")
+
+class FrozenDict(dict):
+    __slots__ = ()
+    __setitem__ = __delitem__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        return (self.__class__, (dict(self),))
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        from copy import deepcopy
+        return deepcopy(dict(self), memo)
+
+class FrozenOrderedDict(OrderedDict):
+
+    def __init__(self, items=()):
+        OrderedDict.__init__(self)
+        if hasattr(items, 'items'):
+            items = items.items()
+        for key, value in items:
+            OrderedDict.__setitem__(self, key, value)
+        self._frozen = True
+
+    def __setitem__(self, key, value, *args):
+        if getattr(self, '_frozen', False):
+            _readonly()
+        OrderedDict.__setitem__(self, key, value, *args)
+
+    __delitem__ = clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        return (self.__class__, (list(self.items()),))
+
+    def copy(self):
+        return OrderedDict(self)
+
+    __copy__ = copy
+
+    def __deepcopy__(self, memo):
+        from copy import deepcopy
+        return deepcopy(OrderedDict(self), memo)
+
+FROZEN_TYPES = (FrozenDict, FrozenOrderedDict)
+
+def _frozen_dict(d):
+    if isinstance(d, FROZEN_TYPES):
+        return d
+    if isinstance(d, OrderedDict):
+        return FrozenOrderedDict(d.items())
+    return FrozenDict(d.items())
+
+def _freeze_nested(d, depth, memo, leaf=_frozen_dict):
+    # freezes depth levels of dicts, the innermost with leaf; inner dicts are
+    # frozen once by identity
+    if isinstance(d, FROZEN_TYPES):
+        return d
+    if depth == 1:
+        return leaf(d)
+    items = []
+    for key, value in d.items():
+        frozen = memo.get(id(value))
+        if frozen is None:
+            frozen = _freeze_nested(value, depth - 1, memo, leaf)
+            memo[id(value)] = frozen
+        items.append((key, frozen))
+    if isinstance(d, OrderedDict):
+        return FrozenOrderedDict(items)
+    return FrozenDict(items)
+
+def _freeze_storage(G):
+    memo = {}
+    # node -> nbr -> (key ->) attributes
+    depth = 4 if G.is_multigraph() else 3
+    G.graph = _frozen_dict(G.graph)
+    if '_node' in G.__dict__:
+        # Interned* graphs: id keyed storage behind key translating views
+        G._node = _freeze_nested(G._node, 2, memo)
+        if G.is_directed():
+            G.id_succ = G.id_adj = _freeze_nested(G.id_succ, depth, memo)
+            G.id_pred = _freeze_nested(G.id_pred, depth, memo)
+        else:
+            G.id_adj = _freeze_nested(G.id_adj, depth, memo)
+        G.ids = _frozen_dict(G.ids)
+        G.keys = tuple(G.keys)
+        G.free = tuple(G.free)
+        G._make_views()
+        return G
+    leaf = _frozen_dict
+    if 'node_store' in G.__dict__:
+        # Columnar* graphs: the attribute rows stay in their stores, read-only
+        from mininx.classes.columnar import freeze_row
+        leaf = freeze_row
+    G.node = _freeze_nested(G.node, 2, memo, leaf)
+    if G.is_directed():
+        G.succ = G.adj = G.edge = _freeze_nested(G.succ, depth, memo, leaf)
+        G.pred = _freeze_nested(G.pred, depth, memo, leaf)
+    else:
+        G.adj = G.edge = _freeze_nested(G.adj, depth, memo, leaf)
+    return G
+
+def _attr_key(d):
+    try:
+        return frozenset(d.items())
+    except TypeError: # unhashable attribute values
+        return repr(sorted(d.items()))
+
+class FrozenGraphMixin(object):
+    frozen = True
+
+    def copy(self, with_data=True):
+        if with_data:
+            return self
+        # like Graph.copy(with_data=False): a graph that can be changed, whose
+        # attribute dicts hold the same values
+        return self.mutable_class(self)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        # bound factory methods (Columnar*) can not be pickled and are not needed
+        getstate = getattr(super(FrozenGraphMixin, self), '__getstate__', None)
+        state = getstate() if getstate is not None else self.__dict__
+        state = dict((name, value) for name, value in state.items()
+                     if not isinstance(value, MethodType))
+        return (_unpickle_frozen, (self.mutable_class, state))
+
+    def subgraph(self, nbunch):
+        return _freeze_copy(super(FrozenGraphMixin, self).subgraph(nbunch))
+
+    def edge_subgraph(self, edges):
+        return _freeze_copy(super(FrozenGraphMixin, self).edge_subgraph(edges))
+
+    def reverse(self, copy=True):
+        if not copy:
+            _readonly()
+        return freeze_graph(self.mutable_class(self).reverse(copy=False))
+
+    def structure(self):
+        nodes = frozenset((n, _attr_key(d)) for n, d in self.node.items())
+        if self.is_multigraph():
+            edges = ((u, v, k, d) for u, nbrs in self.adj.items()
+                     for v, keydict in nbrs.items() for k, d in keydict.items())
+        else:
+            edges = ((u, v, None, d) for u, nbrs in self.adj.items() for v, d in nbrs.items())
+        if self.is_directed():
+            edges = frozenset(((u, v), k, _attr_key(d)) for u, v, k, d in edges)
+        else:
+            edges = frozenset((frozenset((u, v)), k, _attr_key(d)) for u, v, k, d in edges)
+        return (self.is_directed(), self.is_multigraph(), _attr_key(self.graph), nodes, edges)
+
+    def __hash__(self):
+        try:
+            return self.__dict__['_structural_hash']
+        except KeyError:
+            h = self.__dict__['_structural_hash'] = hash(self.structure())
+            return h
+
+    def __eq__(self, other):
+        if other is self:
+            return True
+        if not isinstance(other, FrozenGraphMixin):
+            return NotImplemented
+        return hash(self) == hash(other) and self.structure() == other.structure()
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+def _freeze_copy(H):
+    # H is of the frozen class, or of the mutable one if it was built with
+    # the graph methods (Interned* graphs)
+    _freeze_storage(H)
+    H.__class__ = frozen_class(H.__class__)
+    return H
+
+_FROZEN_CLASSES = {}
+
+def frozen_class(cls):
+    if issubclass(cls, FrozenGraphMixin):
+        return cls
+    try:
+        return _FROZEN_CLASSES[cls]
+    except KeyError:
+        attrs = dict((name, _readonly) for name in MUTATORS if hasattr(cls, name))
+        attrs['mutable_class'] = cls
+        frozen = type('Frozen%s' % cls.__name__, (FrozenGraphMixin, cls), attrs)
+        _FROZEN_CLASSES[cls] = frozen
+        return frozen
+
+def _unpickle_frozen(cls, state):
+    G = cls.__new__(cls)
+    if hasattr(G, '__setstate__'):
+        G.__setstate__(state)
+    else:
+        G.__dict__.update(state)
+    G.__class__ = frozen_class(cls)
+    return G
+
+def freeze_graph(G):
+    if isinstance(G, FrozenGraphMixin):
+        return G
+    _freeze_storage(G)
+    G.__class__ = frozen_class(G.__class__)
+    return G
@@ -13,7 +13,7 @@
 from __future__ import division
 
 from collections import Counter
-from itertools import chain
+from itertools import chain, compress, islice
 try:
     from itertools import zip_longest
 except ImportError:
@@ -22,6 +22,8 @@ except ImportError:
 import mininx as nx
 from mininx.utils import not_implemented_for
 from mininx.utils import pairwise
+from mininx.classes.frozen import freeze_graph
+from mininx.classes.memory import memory_report, SAMPLE
 
 __all__ = ['nodes', 'edges', 'degree', 'degree_histogram', 'neighbors',
            'number_of_nodes', 'number_of_edges', 'density',
@@ -30,7 +32,7 @@ __all__ = ['nodes', 'edges', 'degree', 'degree_histogram', 'neighbors',
            'create_empty_copy', 'set_node_attributes',
            'get_node_attributes', 'set_edge_attributes',
            'get_edge_attributes', 'all_neighbors', 'non_neighbors',
-           'non_edges', 'common_neighbors', 'is_weighted',
+           'non_edges', 'complement', 'common_neighbors', 'is_weighted',
            'is_negatively_weighted', 'is_empty']
 
 def nodes(G):
@@ -68,21 +70,8 @@ def degree_histogram(G):
 def is_directed(G):
     return G.is_directed()
 
-def frozen(*args):
-    raise nx.MiniNXError("Frozen graph can't be modified")
-
 def freeze(G):
-    G.add_node=frozen
-    G.add_nodes_from=frozen
-    G.remove_node=frozen
-    G.remove_nodes_from=frozen
-    G.add_edge=frozen
-    G.add_edges_from=frozen
-    G.remove_edge=frozen
-    G.remove_edges_from=frozen
-    G.clear=frozen
-    G.frozen=True
-    return G
+    return freeze_graph(G)
 
 def is_frozen(G):
     try:
@@ -113,7 +102,7 @@ def create_empty_copy(G, with_data=True):
         H.graph.update(G.graph)
     return H
 
-def info(G, n=None):
+def info(G, n=None, mem=False):
     info='' # append this all to a string
     if n is None:
         info+="Name: %s\n"%G.name
@@ -132,6 +121,15 @@ def info(G, n=None):
                 s=sum(dict(G.degree()).values())
                 info+="Average degree: %8.4f"%\
                     (float(s)/float(nnodes))
+        if mem:
+            report=memory_report(G)
+            if not info.endswith("\n"):
+                info+="\n"
+            info+="Memory (bytes)%s:"%(" estimated from %d nodes"%SAMPLE
+                                        if nnodes > SAMPLE else "")
+            for name, size in report.items():
+                info+="\n  %-12s %12d %5.1f%%"%(name, size,
+                                               100.0*size/max(report['total'], 1))
 
     else:
         if n not in G:
@@ -147,10 +145,15 @@ def set_node_attributes(G, name, values):
     if not isinstance(values, dict):
         values = dict(zip_longest(G, [], fillvalue=values))
 
+    if hasattr(G, 'node_store'):
+        G.set_node_column(name, values.values(), values.keys())
+        return
     for node, value in values.items():
         G.node[node][name] = value
 
 def get_node_attributes(G, name):
+    if hasattr(G, 'node_store'):
+        return G.node_attributes(name)
     return {n: d[name] for n, d in G.node.items() if name in d}
 
 def set_edge_attributes(G, name, values):
@@ -162,7 +165,9 @@ def set_edge_attributes(G, name, values):
             edges = G.edges()
         values = dict(zip_longest(edges, [], fillvalue=values))
 
-    if G.is_multigraph():
+    if hasattr(G, 'edge_store'):
+        G.set_edge_column(name, values.values(), values.keys())
+    elif G.is_multigraph():
         for (u, v, key), value in values.items():
             G[u][v][key][name] = value
     else:
@@ -170,6 +175,8 @@ def set_edge_attributes(G, name, values):
             G[u][v][name] = value
 
 def get_edge_attributes(G, name):
+    if hasattr(G, 'edge_store'):
+        return G.edge_attributes(name)
     if G.is_multigraph():
         edges = G.edges(keys=True, data=True)
     else:
@@ -184,22 +191,145 @@ def all_neighbors(graph, node):
         values = graph.neighbors(node)
     return values
 
+class _BitRows(object):
+    # dense index of the nodes of a graph with adjacency rows as int bitsets;
+    # bit i of a row stands for the i-th node
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.nodes = list(graph)
+        self.index = dict((n, i) for i, n in enumerate(self.nodes))
+        self.full = (1 << len(self.nodes)) - 1
+
+    def row(self, u):
+        # neighbors of u and u itself
+        index = self.index
+        buf = bytearray((len(self.nodes) >> 3) + 1)
+        i = index[u]
+        buf[i >> 3] |= 1 << (i & 7)
+        for v in self.graph[u]:
+            j = index[v]
+            buf[j >> 3] |= 1 << (j & 7)
+        return _int_from_bytes(buf)
+
+    def complement_row(self, u):
+        return ~self.row(u) & self.full
+
+    def members(self, bits, offset=0):
+        # nodes of the set bits, selected in C from the binary digits
+        return compress(islice(self.nodes, offset, None), _selectors(bin(bits)[:1:-1]))
+
+try:
+    int.from_bytes
+    _SELECT = str.maketrans('01', '\x00\x01')
+    def _int_from_bytes(buf):
+        return int.from_bytes(bytes(buf), 'little')
+    def _selectors(digits):
+        return digits.translate(_SELECT).encode('latin-1')
+except AttributeError:
+    from binascii import hexlify
+    from string import maketrans
+    _SELECT = maketrans('01', '\x00\x01')
+    def _int_from_bytes(buf):
+        buf.reverse()
+        return int(hexlify(buf), 16)
+    def _selectors(digits):
+        return bytearray(digits.translate(_SELECT))
+
 def non_neighbors(graph, node):
-    nbors = set(neighbors(graph, node)) | {node}
-    return (nnode for nnode in graph if nnode not in nbors)
+    rows = _BitRows(graph)
+    return rows.members(rows.complement_row(node))
 
 def non_edges(graph):
+    rows = _BitRows(graph)
     if graph.is_directed():
-        for u in graph:
-            for v in non_neighbors(graph, u):
+        for u in rows.nodes:
+            for v in rows.members(rows.complement_row(u)):
                 yield (u, v)
     else:
-        nodes = set(graph)
-        while nodes:
-            u = nodes.pop()
-            for v in nodes - set(graph[u]):
+        # pairs (u, v) with u before v in the node index
+        for i, u in enumerate(rows.nodes):
+            for v in rows.members(rows.complement_row(u) >> (i + 1), i + 1):
                 yield (u, v)
 
+class ComplementView(object):
+    # read-only complement of a graph without self loops; it follows the
+    # changes of the graph and its rows are built only when they are visited
+
+    def __init__(self, graph):
+        self._graph = graph
+
+    def is_directed(self):
+        return self._graph.is_directed()
+
+    def is_multigraph(self):
+        return False
+
+    def __iter__(self):
+        return iter(self._graph)
+
+    def __contains__(self, n):
+        return n in self._graph
+
+    def __len__(self):
+        return len(self._graph)
+
+    def nodes(self, data=False):
+        return self._graph.nodes(data)
+
+    def number_of_nodes(self):
+        return len(self._graph)
+
+    def has_node(self, n):
+        return n in self._graph
+
+    def has_edge(self, u, v):
+        G = self._graph
+        return u != v and u in G and v in G and v not in G[u]
+
+    def neighbors(self, n):
+        if n not in self._graph:
+            raise nx.MiniNXError("The node %s is not in the graph." % (n,))
+        return non_neighbors(self._graph, n)
+
+    successors = neighbors
+
+    def predecessors(self, n):
+        G = self._graph
+        if n not in G:
+            raise nx.MiniNXError("The node %s is not in the graph." % (n,))
+        if not G.is_directed():
+            return non_neighbors(G, n)
+        return (u for u in G if u != n and n not in G[u])
+
+    def __getitem__(self, n):
+        return self.neighbors(n)
+
+    def edges(self):
+        return non_edges(self._graph)
+
+    def number_of_edges(self):
+        G = self._graph
+        n = len(G)
+        # distinct adjacent pairs, counting parallel edges once
+        adjacent = sum(len(G[u]) - (u in G[u]) for u in G)
+        if G.is_directed():
+            return n * (n - 1) - adjacent
+        return (n * (n - 1) - adjacent) // 2
+
+    def degree(self, n):
+        G = self._graph
+        if n not in G:
+            raise nx.MiniNXError("The node %s is not in the graph." % (n,))
+        outdeg = len(G) - 1 - (len(G[n]) - (n in G[n]))
+        if not G.is_directed():
+            return outdeg
+        indeg = len(G) - 1 - (len(G.pred[n]) - (n in G.pred[n]))
+        return outdeg + indeg
+
+def complement(graph):
+    return ComplementView(graph)
+
 @not_implemented_for('directed')
 def common_neighbors(G, u, v):
     if u not in G:
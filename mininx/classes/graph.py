@@ -1,3 +1,10 @@
+from copy import deepcopy
+
+from mininx.exception import MiniNXError
+from mininx.classes.batch import GraphBatch
+from mininx.classes import events
+import mininx.convert as convert
+
 class Graph(object):
     node_dict_factory = dict
     adjlist_dict_factory = dict
@@ -162,28 +169,36 @@ class Graph(object):
             except AttributeError:
                 raise MiniNXError(
                     "The attr_dict argument must be a dictionary.")
-        # process ebunch
+        # process ebunch; storage and factories are looked up once
+        adj, node = self.adj, self.node
+        adjlist_factory = self.adjlist_dict_factory
+        edge_factory = self.edge_attr_dict_factory
         for e in ebunch:
             ne = len(e)
             if ne == 3:
                 u, v, dd = e
             elif ne == 2:
                 u, v = e
-                dd = {}  # doesnt need edge_attr_dict_factory
+                dd = None  # doesnt need edge_attr_dict_factory
             else:
                 raise MiniNXError(
                     "Edge tuple %s must be a 2-tuple or 3-tuple." % (e,))
-            if u not in self.node:
-                self.adj[u] = self.adjlist_dict_factory()
-                self.node[u] = {}
-            if v not in self.node:
-                self.adj[v] = self.adjlist_dict_factory()
-                self.node[v] = {}
-            datadict = self.adj[u].get(v, self.edge_attr_dict_factory())
-            datadict.update(attr_dict)
-            datadict.update(dd)
-            self.adj[u][v] = datadict
-            self.adj[v][u] = datadict
+            if u not in node:
+                adj[u] = adjlist_factory()
+                node[u] = {}
+            if v not in node:
+                adj[v] = adjlist_factory()
+                node[v] = {}
+            adj_u = adj[u]
+            datadict = adj_u.get(v)
+            if datadict is None:
+                datadict = edge_factory()
+                adj_u[v] = datadict
+                adj[v][u] = datadict
+            if attr_dict:
+                datadict.update(attr_dict)
+            if dd:
+                datadict.update(dd)
 
     def add_weighted_edges_from(self, ebunch, weight='weight', **attr):
         self.add_edges_from(((u, v, {weight: d}) for u, v, d in ebunch),
@@ -285,6 +300,18 @@ class Graph(object):
         self.node.clear()
         self.graph.clear()
 
+    def batch(self):
+        return GraphBatch(self)
+
+    def subscribe(self, listener, batched=False):
+        events.subscribe(self, listener, batched)
+
+    def unsubscribe(self, listener):
+        events.unsubscribe(self, listener)
+
+    def hold_events(self):
+        return events.hold_events(self)
+
     def copy(self, with_data=True):
         if with_data:
             return deepcopy(self)
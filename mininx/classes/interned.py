@@ -0,0 +1,693 @@
+''' Graphs with interned node keys
+
+NOTE:
+ - an Interned* graph maps every node key to a dense integer id the first time
+   it is seen (G.ids: key -> id, G.keys: id -> key) and keys its node,
+   adjacency and edge storage by those ids; a key is hashed and compared once
+   per call instead of once per dict it is stored in (tuples do not cache
+   their hash)
+ - G.ids holds the keys of the nodes of the graph and nothing else, so a key
+   in G.ids is a node
+ - the key based edge methods look up the neighbors of u by key in an index
+   of the id keyed neighbor dicts (rebuilt with the views), so only v is
+   translated; adding or updating an edge between nodes that are there is
+   faster than in Graph/DiGraph, has_edge pays the one lookup of v and adding
+   nodes costs more. The gain is in the id based methods and in id keyed
+   storage that maps onto arrays
+ - the methods of the graph take and return node keys as usual; G.node, G.adj,
+   G.succ and G.pred are views that translate keys for code that reads the
+   storage directly, at some cost per access; writing through a view takes
+   keys of nodes only, it does not add nodes
+ - node_id/node_key/node_ids translate at the boundary; add_edge_by_id,
+   has_edge_by_id, remove_edge_by_id, neighbor_ids (successor_ids and
+   predecessor_ids) and edge_ids work on ids for hot loops; G.id_adj (and
+   G.id_pred) is the id keyed adjacency itself, e.g. to fill arrays
+ - an id is valid while its node is in the graph; ids of removed nodes are
+   reused so that ids stay dense
+'''
+
+from copy import deepcopy
+
+from .graph import Graph
+from .digraph import DiGraph
+from mininx.exception import MiniNXError
+import mininx.convert as convert
+
+__all__ = ['InternedGraph', 'InternedDiGraph']
+
+VIEWS = ('node', 'adj', 'edge', 'succ', 'pred')
+
+class IdKeyed(object):
+    # mapping by node keys over a dict keyed by node ids
+    __slots__ = ('data', 'G')
+
+    def __init__(self, data, G):
+        self.data = data
+        self.G = G
+
+    def __reduce__(self):
+        return (self.__class__, (self.data, self.G))
+
+    def _wrap(self, value):
+        return value
+
+    def _unwrap(self, value):
+        return value
+
+    def __getitem__(self, key):
+        return self._wrap(self.data[self.G.ids[key]])
+
+    def __setitem__(self, key, value):
+        self.data[self.G.ids[key]] = self._unwrap(value)
+
+    def __delitem__(self, key):
+        del self.data[self.G.ids[key]]
+
+    def __contains__(self, key):
+        i = self.G.ids.get(key)
+        return i is not None and i in self.data
+
+    def __iter__(self):
+        keys = self.G.keys
+        return (keys[i] for i in self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __eq__(self, other):
+        try:
+            return dict(self.items()) == dict(other.items())
+        except AttributeError:
+            return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def keys(self):
+        keys = self.G.keys
+        return [ keys[i] for i in self.data ]
+
+    def values(self):
+        return [ self._wrap(value) for value in self.data.values() ]
+
+    def items(self):
+        keys = self.G.keys
+        return [ (keys[i], self._wrap(value)) for i, value in self.data.items() ]
+
+    def get(self, key, default=None):
+        i = self.G.ids.get(key)
+        if i is None or i not in self.data:
+            return default
+        return self._wrap(self.data[i])
+
+    def pop(self, key, *default):
+        i = self.G.ids.get(key)
+        if i is None or i not in self.data:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        return self._wrap(self.data.pop(i))
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, other=(), **attr):
+        items = other.items() if hasattr(other, 'items') else other
+        for key, value in items:
+            self[key] = value
+        for key, value in attr.items():
+            self[key] = value
+
+    def clear(self):
+        self.data.clear()
+
+    def copy(self):
+        return dict(self.items())
+
+class IdAdjacency(IdKeyed):
+    # node key -> IdKeyed view of the neighbors
+    __slots__ = ()
+
+    def _wrap(self, value):
+        return IdKeyed(value, self.G)
+
+    def _unwrap(self, value):
+        if isinstance(value, IdKeyed):
+            return value.data
+        ids = self.G.ids
+        nbrs = self.G.adjlist_dict_factory()
+        for key, datadict in value.items():
+            nbrs[ids[key]] = datadict
+        return nbrs
+
+    # writes to the (successor) adjacency keep the key index of G in step
+
+    def _index(self):
+        G = self.G
+        return G._nbrs if self.data is G.id_adj else None
+
+    def __setitem__(self, key, value):
+        IdKeyed.__setitem__(self, key, value)
+        index = self._index()
+        if index is not None:
+            index[key] = self.data[self.G.ids[key]]
+
+    def __delitem__(self, key):
+        IdKeyed.__delitem__(self, key)
+        index = self._index()
+        if index is not None:
+            del index[key]
+
+    def pop(self, key, *default):
+        index = self._index()
+        if index is not None:
+            index.pop(key, None)
+        return IdKeyed.pop(self, key, *default)
+
+    def clear(self):
+        IdKeyed.clear(self)
+        index = self._index()
+        if index is not None:
+            index.clear()
+
+class InternedMixin(object):
+
+    def __init__(self, data=None, **attr):
+        self.ids = {}
+        self.keys = []
+        self.free = []
+        super(InternedMixin, self).__init__(**attr)
+        self._init_storage()
+        if data is not None:
+            convert.to_networkx_graph(data, create_using=self)
+            self.graph.update(attr)
+
+    def __getstate__(self):
+        # the views refer back to the graph; they and the key index are
+        # rebuilt on unpickling
+        return dict((name, value) for name, value in self.__dict__.items()
+                    if name not in VIEWS and name != '_nbrs')
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._make_views()
+
+    def _intern(self, n):
+        # only for a node that is added right away: G.ids holds nodes only
+        i = self.ids.get(n)
+        if i is None:
+            if self.free:
+                i = self.free.pop()
+                self.keys[i] = n
+            else:
+                i = len(self.keys)
+                self.keys.append(n)
+            self.ids[n] = i
+        return i
+
+    def _make_index(self):
+        # node key -> the id keyed neighbor dict, for the key based edge methods
+        keys = self.keys
+        self._nbrs = dict((keys[i], nbrs) for i, nbrs in self.id_adj.items())
+
+    def _release(self, i):
+        del self.ids[self.keys[i]]
+        self.keys[i] = None
+        self.free.append(i)
+
+    # translation at the boundary
+
+    def node_id(self, n):
+        try:
+            return self.ids[n]
+        except KeyError:
+            raise MiniNXError("The node %s is not in the graph." % (n,))
+
+    def node_key(self, i):
+        try:
+            if i in self._node:
+                return self.keys[i]
+        except TypeError:
+            pass
+        raise MiniNXError("The node id %s is not in the graph." % (i,))
+
+    def node_ids(self, nodes=None):
+        if nodes is None:
+            return list(self._node)
+        node_id = self.node_id
+        return [ node_id(n) for n in nodes ]
+
+    def __iter__(self):
+        keys = self.keys
+        return (keys[i] for i in self._node)
+
+    def __contains__(self, n):
+        try:
+            return n in self.ids
+        except TypeError:
+            return False
+
+    has_node = __contains__
+
+    def __len__(self):
+        return len(self._node)
+
+    def number_of_nodes(self):
+        return len(self._node)
+
+    order = number_of_nodes
+
+    def add_node(self, n, attr_dict=None, **attr):
+        if attr_dict is None:
+            attr_dict = attr
+        else:
+            try:
+                attr_dict.update(attr)
+            except AttributeError:
+                raise MiniNXError(
+                    "The attr_dict argument must be a dictionary.")
+        i = self._intern(n)
+        if i not in self._node:
+            self._new_node(i, attr_dict)
+        else:
+            self._node[i].update(attr_dict)
+
+    def add_nodes_from(self, nodes, **attr):
+        for n in nodes:
+            try:
+                i = self._intern(n)
+                ndict = None
+            except TypeError:
+                nn, ndict = n
+                i = self._intern(nn)
+            if i not in self._node:
+                newdict = attr.copy()
+                if ndict:
+                    newdict.update(ndict)
+                self._new_node(i, newdict)
+            else:
+                olddict = self._node[i]
+                olddict.update(attr)
+                if ndict:
+                    olddict.update(ndict)
+
+    def remove_nodes_from(self, nodes):
+        for n in nodes:
+            try:
+                self.remove_node(n)
+            except (MiniNXError, TypeError):
+                pass
+
+    def _edge_ids(self, u, v):
+        # ids of u and v, added as nodes if needed
+        ids = self.ids
+        i = ids.get(u)
+        if i is None:
+            i = self._intern(u)
+            self._new_node(i, {})
+        j = ids.get(v)
+        if j is None:
+            j = self._intern(v)
+            self._new_node(j, {})
+        return i, j
+
+    def add_edge(self, u, v, attr_dict=None, **attr):
+        if attr_dict is None:
+            attr_dict = attr
+        else:
+            try:
+                attr_dict.update(attr)
+            except AttributeError:
+                raise MiniNXError(
+                    "The attr_dict argument must be a dictionary.")
+        # between existing nodes u is not translated unless the edge is new
+        ids = self.ids
+        nbrs = self._nbrs.get(u)
+        j = ids.get(v)
+        if nbrs is None or j is None:
+            i, j = self._edge_ids(u, v)
+            self._add_edge(i, j, attr_dict)
+            return
+        datadict = nbrs.get(j)
+        if datadict is None:
+            datadict = self.edge_attr_dict_factory()
+            self._set_edge(ids[u], j, datadict)
+        datadict.update(attr_dict)
+
+    def add_edges_from(self, ebunch, attr_dict=None, **attr):
+        if attr_dict is None:
+            attr_dict = attr
+        else:
+            try:
+                attr_dict.update(attr)
+            except AttributeError:
+                raise MiniNXError(
+                    "The attr_dict argument must be a dictionary.")
+        edge_ids, add_edge = self._edge_ids, self._add_edge
+        for e in ebunch:
+            ne = len(e)
+            if ne == 3:
+                u, v, dd = e
+            elif ne == 2:
+                u, v = e
+                dd = None
+            else:
+                raise MiniNXError(
+                    "Edge tuple %s must be a 2-tuple or 3-tuple." % (e,))
+            i, j = edge_ids(u, v)
+            datadict = add_edge(i, j, attr_dict)
+            if dd:
+                datadict.update(dd)
+
+    def add_edge_by_id(self, i, j, attr_dict=None, **attr):
+        if i not in self._node or j not in self._node:
+            raise MiniNXError("The node ids %s and %s must be in the graph." % (i, j))
+        return self._add_edge(i, j, attr if attr_dict is None else dict(attr_dict, **attr))
+
+    def remove_edge(self, u, v):
+        ids = self.ids
+        try:
+            self._remove_edge(ids[u], ids[v])
+        except KeyError:
+            raise MiniNXError("The edge %s-%s is not in the graph" % (u, v))
+
+    def remove_edge_by_id(self, i, j):
+        try:
+            self._remove_edge(i, j)
+        except KeyError:
+            raise MiniNXError("The edge %s-%s is not in the graph" % (i, j))
+
+    def remove_edges_from(self, ebunch):
+        ids = self.ids
+        for e in ebunch:
+            u, v = e[:2]
+            try:
+                self._remove_edge(ids[u], ids[v])
+            except KeyError:
+                pass
+
+    def has_edge(self, u, v):
+        try:
+            return self.ids[v] in self._nbrs[u]
+        except (KeyError, TypeError):
+            return False
+
+    def has_edge_by_id(self, i, j):
+        try:
+            return j in self.id_adj[i]
+        except KeyError:
+            return False
+
+    def neighbor_ids(self, i):
+        try:
+            return iter(self.id_adj[i])
+        except KeyError:
+            raise MiniNXError("The node id %s is not in the graph." % (i,))
+
+    def neighbors(self, n):
+        try:
+            nbrs = self._nbrs[n]
+        except KeyError:
+            raise MiniNXError("The node %s is not in the graph." % (n,))
+        keys = self.keys
+        return (keys[j] for j in nbrs)
+
+    def get_edge_data(self, u, v, default=None):
+        try:
+            return self._nbrs[u][self.ids[v]]
+        except KeyError:
+            return default
+
+    def _clear_ids(self):
+        self.ids.clear()
+        del self.keys[:]
+        del self.free[:]
+
+    def _new_graph(self):
+        # frozen graphs build their subgraphs with the mutable class
+        return getattr(self, 'mutable_class', self.__class__)()
+
+    def subgraph(self, nbunch):
+        H = self._new_graph()
+        for n in self.nbunch_iter(nbunch):
+            H.add_node(n)
+            H._node[H.ids[n]] = self.node[n]
+        self._copy_edges(H, ((u, v) for u, v in self.edges() if u in H.ids and v in H.ids))
+        H.graph = self.graph
+        return H
+
+    def edge_subgraph(self, edges):
+        H = self._new_graph()
+        for u, v in edges:
+            if not self.has_edge(u, v):
+                continue
+            for n in (u, v):
+                if n not in H.ids:
+                    H.add_node(n)
+                    H._node[H.ids[n]] = self.node[n]
+            self._copy_edges(H, [(u, v)])
+        H.graph = self.graph
+        return H
+
+    def _copy_edges(self, H, edges):
+        # H shares the edge attribute dicts of self
+        get_edge_data, ids = self.get_edge_data, H.ids
+        for u, v in edges:
+            H._set_edge(ids[u], ids[v], get_edge_data(u, v))
+
+    def _with_data(self, H, edges):
+        H.graph = deepcopy(self.graph)
+        H.name = self.name
+        for n, d in self.node.items():
+            H.add_node(n, deepcopy(d))
+        H.add_edges_from((u, v, deepcopy(d)) for u, v, d in edges)
+        return H
+
+class InternedGraph(InternedMixin, Graph):
+
+    def _init_storage(self):
+        self._node = {}
+        self.id_adj = {}
+        self._make_views()
+
+    def _make_views(self):
+        self.node = IdKeyed(self._node, self)
+        self.adj = self.edge = IdAdjacency(self.id_adj, self)
+        self._make_index()
+
+    def _new_node(self, i, attr_dict):
+        self.id_adj[i] = self._nbrs[self.keys[i]] = self.adjlist_dict_factory()
+        self._node[i] = attr_dict
+
+    def remove_node(self, n):
+        try:
+            i = self.ids[n]
+            nbrs = self.id_adj.pop(i)
+        except KeyError:
+            raise MiniNXError("The node %s is not in the graph." % (n,))
+        del self._node[i]
+        del self._nbrs[n]
+        id_adj = self.id_adj
+        for j in nbrs:
+            if j != i:
+                del id_adj[j][i]
+        self._release(i)
+
+    def _add_edge(self, i, j, attr_dict):
+        nbrs = self.id_adj[i]
+        datadict = nbrs.get(j)
+        if datadict is None:
+            datadict = self.edge_attr_dict_factory()
+            nbrs[j] = datadict
+            self.id_adj[j][i] = datadict
+        datadict.update(attr_dict)
+        return datadict
+
+    def _set_edge(self, i, j, datadict):
+        self.id_adj[i][j] = self.id_adj[j][i] = datadict
+
+    def _remove_edge(self, i, j):
+        del self.id_adj[i][j]
+        if i != j:
+            del self.id_adj[j][i]
+
+    def edges(self, nbunch=None, data=False, default=None):
+        keys, id_adj = self.keys, self.id_adj
+        if nbunch is None:
+            nodes = list(id_adj)
+        else:
+            ids = self.ids
+            nodes = [ ids[n] for n in self.nbunch_iter(nbunch) ]
+        seen = set()
+        for i in nodes:
+            u = keys[i]
+            for j, ddict in id_adj[i].items():
+                if j in seen:
+                    continue
+                if data is True:
+                    yield (u, keys[j], ddict)
+                elif data is not False:
+                    yield (u, keys[j], ddict[data] if data in ddict else default)
+                else:
+                    yield (u, keys[j])
+            seen.add(i)
+
+    def edge_ids(self):
+        seen = set()
+        for i, nbrs in self.id_adj.items():
+            for j in nbrs:
+                if j not in seen:
+                    yield (i, j)
+            seen.add(i)
+
+    def clear(self):
+        self.name = ''
+        self.id_adj.clear()
+        self._nbrs.clear()
+        self._node.clear()
+        self.graph.clear()
+        self._clear_ids()
+
+    def to_directed(self):
+        H = InternedDiGraph()
+        return self._with_data(H, ((u, v, d) for u, nbrs in self.adj.items()
+                                   for v, d in nbrs.items()))
+
+class InternedDiGraph(InternedMixin, DiGraph):
+
+    def _init_storage(self):
+        self._node = {}
+        self.id_adj = self.id_succ = {}
+        self.id_pred = {}
+        self._make_views()
+
+    def _make_views(self):
+        self.node = IdKeyed(self._node, self)
+        self.adj = self.succ = self.edge = IdAdjacency(self.id_succ, self)
+        self.pred = IdAdjacency(self.id_pred, self)
+        self._make_index()
+
+    def _new_node(self, i, attr_dict):
+        self.id_succ[i] = self._nbrs[self.keys[i]] = self.adjlist_dict_factory()
+        self.id_pred[i] = self.adjlist_dict_factory()
+        self._node[i] = attr_dict
+
+    def remove_node(self, n):
+        try:
+            i = self.ids[n]
+            succs = self.id_succ.pop(i)
+        except KeyError:
+            raise MiniNXError("The node %s is not in the digraph." % (n,))
+        del self._node[i]
+        del self._nbrs[n]
+        preds = self.id_pred.pop(i)
+        id_succ, id_pred = self.id_succ, self.id_pred
+        for j in succs:
+            if j != i:
+                del id_pred[j][i]
+        for j in preds:
+            if j != i:
+                del id_succ[j][i]
+        self._release(i)
+
+    def _add_edge(self, i, j, attr_dict):
+        succ = self.id_succ[i]
+        datadict = succ.get(j)
+        if datadict is None:
+            datadict = self.edge_attr_dict_factory()
+            succ[j] = datadict
+            self.id_pred[j][i] = datadict
+        datadict.update(attr_dict)
+        return datadict
+
+    def _set_edge(self, i, j, datadict):
+        self.id_succ[i][j] = self.id_pred[j][i] = datadict
+
+    def _remove_edge(self, i, j):
+        del self.id_succ[i][j]
+        del self.id_pred[j][i]
+
+    def successor_ids(self, i):
+        return self.neighbor_ids(i)
+
+    def predecessor_ids(self, i):
+        try:
+            return iter(self.id_pred[i])
+        except KeyError:
+            raise MiniNXError("The node id %s is not in the digraph." % (i,))
+
+    def successors(self, n):
+        return self.neighbors(n)
+
+    def predecessors(self, n):
+        try:
+            nbrs = self.id_pred[self.ids[n]]
+        except KeyError:
+            raise MiniNXError("The node %s is not in the digraph." % (n,))
+        keys = self.keys
+        return (keys[j] for j in nbrs)
+
+    def has_successor(self, u, v):
+        return self.has_edge(u, v)
+
+    def has_predecessor(self, u, v):
+        return self.has_edge(v, u)
+
+    def edges(self, nbunch=None, data=False, default=None):
+        keys, id_succ = self.keys, self.id_succ
+        if nbunch is None:
+            nodes = list(id_succ)
+        else:
+            ids = self.ids
+            nodes = [ ids[n] for n in self.nbunch_iter(nbunch) ]
+        for i in nodes:
+            u = keys[i]
+            if data is True:
+                for j, ddict in id_succ[i].items():
+                    yield (u, keys[j], ddict)
+            elif data is not False:
+                for j, ddict in id_succ[i].items():
+                    yield (u, keys[j], ddict[data] if data in ddict else default)
+            else:
+                for j in id_succ[i]:
+                    yield (u, keys[j])
+
+    out_edges = edges
+
+    def edge_ids(self):
+        for i, nbrs in self.id_succ.items():
+            for j in nbrs:
+                yield (i, j)
+
+    def clear(self):
+        self.id_succ.clear()
+        self._nbrs.clear()
+        self.id_pred.clear()
+        self._node.clear()
+        self.graph.clear()
+        self._clear_ids()
+
+    def to_undirected(self, reciprocal=False):
+        H = InternedGraph()
+        edges = self.edges(data=True)
+        if reciprocal is True:
+            edges = ((u, v, d) for u, v, d in edges if self.has_edge(v, u))
+        return self._with_data(H, edges)
+
+    def reverse(self, copy=True):
+        if copy:
+            H = self._with_data(self.__class__(), ((v, u, d) for u, v, d in self.edges(data=True)))
+            H.name = "Reverse of (%s)" % self.name
+            return H
+        self.id_succ, self.id_pred = self.id_pred, self.id_succ
+        self.id_adj = self.id_succ
+        self._make_views()
+        return self
@@ -0,0 +1,183 @@
+''' Memory footprint of graphs and trees
+
+NOTE:
+ - memory_report(G) returns the deep size of G in bytes broken down into
+     graph       the G.graph attribute dict
+     node_keys   the node objects themselves
+     node_attrs  the node attribute dicts (rows of Columnar* graphs)
+     adjacency   the node and adjacency dicts (and key dicts of multigraphs)
+     edge_attrs  the edge attribute dicts (rows of Columnar* graphs)
+     ordering    what OrderedDict adds to those dicts (Ordered* graphs, Tree)
+   followed by one entry per other attribute of G (symtab of a SyntaxTree,
+   node_store of a Columnar* graph, ids of an Interned* graph, ...) and total
+ - every object is counted once, in the first entry that reaches it: a string
+   used as a node key and as an attribute value is a node key
+ - classes, functions and modules are shared and not counted
+ - for a graph of more than sample nodes only a random sample of the nodes is
+   walked and scaled up, and so is any other container of more than sample
+   items; the report is then an estimate (the sample is the same on every
+   call, so the reports of two storage choices compare like with like)
+ - sizes are those of sys.getsizeof, which does not count allocator overhead
+'''
+
+import sys
+import random
+from types import ModuleType, FunctionType, MethodType, BuiltinFunctionType, CodeType
+from collections import OrderedDict
+
+__all__ = ['memory_report']
+
+SAMPLE = 10000
+
+STORAGE = ('graph', 'node', 'adj', 'succ', 'pred', 'edge', '_node', 'id_adj', 'id_succ',
+           'id_pred')
+
+SHARED = (type, ModuleType, FunctionType, MethodType, BuiltinFunctionType, CodeType)
+
+def _shallow(d):
+    # (size, ordering) of a dict itself
+    size = sys.getsizeof(d)
+    if not isinstance(d, OrderedDict):
+        return size, 0
+    order = type(d).__sizeof__(d) - dict.__sizeof__(d)  # C OrderedDict (Python 3)
+    size -= order
+    links = getattr(d, '_OrderedDict__map', None)       # pure Python OrderedDict
+    if links is not None:
+        order += sys.getsizeof(links) + sys.getsizeof(d._OrderedDict__root) * (len(links) + 1)
+    return size, order
+
+class Walker(object):
+    # deep sizes with a shared set of counted objects
+
+    def __init__(self, sample, rng):
+        self.sample = sample
+        self.rng = rng
+        self.seen = set()   # ids of counted objects
+        self.fence = set()  # ids of objects not to walk into for now
+
+    def _items(self, obj):
+        if isinstance(obj, dict):
+            items = list(obj.items())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            items = list(obj)
+        else:
+            return [], 1.0
+        if len(items) <= self.sample:
+            return items, 1.0
+        return self.rng.sample(items, self.sample), float(len(items)) / self.sample
+
+    def size(self, obj):
+        # (size, ordering) of obj and everything it refers to, not counted before
+        seen = self.seen
+        total = order = 0.0
+        stack = [(obj, 1.0)]
+        while stack:
+            obj, weight = stack.pop()
+            if id(obj) in seen or id(obj) in self.fence or isinstance(obj, SHARED):
+                continue
+            seen.add(id(obj))
+            size, extra = _shallow(obj) if isinstance(obj, dict) else (sys.getsizeof(obj), 0)
+            total += weight * size
+            order += weight * extra
+            items, scale = self._items(obj)
+            if isinstance(obj, dict):
+                for key, value in items:
+                    stack.append((key, weight * scale))
+                    stack.append((value, weight * scale))
+                continue
+            if items:
+                stack.extend((item, weight * scale) for item in items)
+                continue
+            attrs = getattr(obj, '__dict__', None)
+            if attrs is not None:
+                stack.append((attrs, weight))
+            for cls in type(obj).__mro__:
+                for slot in getattr(cls, '__slots__', ()):
+                    value = getattr(obj, slot, None)
+                    if value is not None:
+                        stack.append((value, weight))
+        return total, order
+
+    def container(self, d):
+        # (size, ordering) of d itself, not of what it holds
+        if id(d) in self.seen:
+            return 0, 0
+        self.seen.add(id(d))
+        return _shallow(d)
+
+def _storage(G):
+    # node dict and adjacency dicts as stored; Interned* graphs store by id
+    if '_node' in G.__dict__:
+        nodes = G._node
+        adjs = [G.id_succ, G.id_pred] if G.is_directed() else [G.id_adj]
+        keys = G.keys
+    else:
+        nodes = G.node
+        adjs = [G.succ, G.pred] if G.is_directed() else [G.adj]
+        keys = None
+    return nodes, adjs, keys
+
+def memory_report(G, sample=SAMPLE):
+    report = OrderedDict((name, 0.0) for name in
+                         ('graph', 'node_keys', 'node_attrs', 'adjacency', 'edge_attrs', 'ordering'))
+    walker = Walker(sample, random.Random(0))
+    walker.seen.update((id(G), id(G.__dict__), id(None), id(True), id(False)))
+
+    def add(name, sizes, weight=1.0):
+        report[name] += weight * sizes[0]
+        report['ordering'] += weight * sizes[1]
+
+    nodes, adjs, keys = _storage(G)
+    sampled = list(nodes)
+    scale = 1.0
+    if len(sampled) > sample:
+        sampled = walker.rng.sample(sampled, sample)
+        scale = float(len(nodes)) / sample
+
+    add('graph', walker.size(G.graph))
+    for n in sampled:
+        add('node_keys', walker.size(keys[n] if keys is not None else n), scale)
+    # the other attributes of G (stores, symbol tables, ...) are walked last
+    walker.fence.update(id(value) for name, value in G.__dict__.items() if name not in STORAGE)
+    add('adjacency', walker.container(nodes))
+    for adj in adjs:
+        add('adjacency', walker.container(adj))
+
+    multigraph = G.is_multigraph()
+    undirected = not G.is_directed()
+    # an undirected edge is reached from both of its ends, for half of its size
+    # each time; its dicts are measured once and their sizes kept by id
+    measured = {}
+    def edge_size(d, sizer):
+        if not undirected:
+            return sizer(d)
+        sizes = measured.get(id(d))
+        if sizes is None:
+            sizes = measured[id(d)] = sizer(d)
+        return sizes
+
+    for n in sampled:
+        add('node_attrs', walker.size(nodes[n]), scale)
+        for adj in adjs[1:]:
+            add('adjacency', walker.container(adj[n]), scale)
+        nbrs = adjs[0][n]
+        add('adjacency', walker.container(nbrs), scale)
+        for nbr, data in nbrs.items():
+            weight = scale / 2 if undirected and nbr != n else scale
+            if multigraph:
+                add('adjacency', edge_size(data, walker.container), weight)
+                for key, attrs in data.items():
+                    add('adjacency', walker.size(key), scale)
+                    add('edge_attrs', edge_size(attrs, walker.size), weight)
+            else:
+                add('edge_attrs', edge_size(data, walker.size), weight)
+
+    walker.fence.clear()
+    for name in sorted(G.__dict__):
+        if name in STORAGE:
+            continue
+        size, order = walker.size(G.__dict__[name])
+        if size + order:
+            report[name] = size + order
+    report['total'] = sum(report.values())
+    return OrderedDict((name, int(round(size))) for name, size in report.items())
@@ -9,13 +9,13 @@ from copy import deepcopy
 import mininx as nx
 from mininx.classes.graph import Graph  # for doctests
 from mininx.classes.digraph import DiGraph
-from mininx.classes.multigraph import MultiGraph
+from mininx.classes.multigraph import MultiGraph, EdgeKeyDict, new_key
 from mininx.exception import MiniNXError
 
 class MultiDiGraph(MultiGraph,DiGraph):
     # node_dict_factory=dict    # already assigned in Graph
     # adjlist_dict_factory=dict
-    edge_key_dict_factory = dict
+    edge_key_dict_factory = EdgeKeyDict
     # edge_attr_dict_factory=dict
 
     def __init__(self, data=None, **attr):
@@ -44,14 +44,12 @@ class MultiDiGraph(MultiGraph,DiGraph):
         if v in self.succ[u]:
             keydict = self.adj[u][v]
             if key is None:
-                # find a unique integer key
-                # other methods might be better here?
-                key = len(keydict)
-                while key in keydict:
-                    key += 1
-            datadict = keydict.get(key, self.edge_key_dict_factory())
+                key = new_key(keydict)
+            datadict = keydict.get(key)
+            if datadict is None:
+                datadict = self.edge_attr_dict_factory()
+                keydict[key] = datadict
             datadict.update(attr_dict)
-            keydict[key] = datadict
         else:
             # selfloops work this way without special treatment
             if key is None:
@@ -63,6 +61,64 @@ class MultiDiGraph(MultiGraph,DiGraph):
             self.succ[u][v] = keydict
             self.pred[v][u] = keydict
 
+    def add_edges_from(self, ebunch, attr_dict=None, **attr):
+        # set up attribute dict
+        if attr_dict is None:
+            attr_dict = attr
+        else:
+            try:
+                attr_dict.update(attr)
+            except AttributeError:
+                raise MiniNXError(
+                    "The attr_dict argument must be a dictionary.")
+        # process ebunch; storage and factories are looked up once
+        succ, pred, node = self.succ, self.pred, self.node
+        adjlist_factory = self.adjlist_dict_factory
+        key_factory = self.edge_key_dict_factory
+        edge_factory = self.edge_attr_dict_factory
+        for e in ebunch:
+            ne = len(e)
+            if ne == 4:
+                u, v, key, dd = e
+            elif ne == 3:
+                u, v, dd = e
+                key = None
+            elif ne == 2:
+                u, v = e
+                dd = None
+                key = None
+            else:
+                raise MiniNXError(
+                    "Edge tuple %s must be a 2-tuple, 3-tuple or 4-tuple." % (e,))
+            if u not in succ:
+                succ[u] = adjlist_factory()
+                pred[u] = adjlist_factory()
+                node[u] = {}
+            if v not in succ:
+                succ[v] = adjlist_factory()
+                pred[v] = adjlist_factory()
+                node[v] = {}
+            succ_u = succ[u]
+            keydict = succ_u.get(v)
+            if keydict is None:
+                if key is None:
+                    key = 0
+                keydict = key_factory()
+                succ_u[v] = keydict
+                pred[v][u] = keydict
+                datadict = None
+            else:
+                if key is None:
+                    key = new_key(keydict)
+                datadict = keydict.get(key)
+            if datadict is None:
+                datadict = edge_factory()
+                keydict[key] = datadict
+            if attr_dict:
+                datadict.update(attr_dict)
+            if dd:
+                datadict.update(dd)
+
     def remove_edge(self, u, v, key=None):
         try:
             d = self.adj[u][v]
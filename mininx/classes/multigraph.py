@@ -10,10 +10,38 @@ import mininx as nx
 from mininx.classes.graph import Graph
 from mininx import MiniNXError
 
+class EdgeKeyDict(dict):
+    # key -> attribute dict of the edges between two nodes; next_key is where
+    # the search for a free integer key starts
+    __slots__ = ('next_key',)
+
+    def __reduce__(self):
+        return (self.__class__, (dict(self),), getattr(self, 'next_key', None))
+
+    def __setstate__(self, next_key):
+        self.next_key = next_key
+
+    def copy(self):
+        keydict = self.__class__(self)
+        keydict.__setstate__(getattr(self, 'next_key', len(self)))
+        return keydict
+
+def new_key(keydict):
+    # keys handed out for a pair only grow, so churn does not make the search
+    # walk over the keys still in use
+    key = getattr(keydict, 'next_key', len(keydict))
+    while key in keydict:
+        key += 1
+    try:
+        keydict.next_key = key + 1
+    except AttributeError:  # dicts of a custom edge_key_dict_factory
+        pass
+    return key
+
 class MultiGraph(Graph):
     # node_dict_factory=dict    # already assigned in Graph
     # adjlist_dict_factory=dict
-    edge_key_dict_factory = dict
+    edge_key_dict_factory = EdgeKeyDict
     # edge_attr_dict_factory=dict
 
     def __init__(self, data=None, **attr):
@@ -40,14 +68,12 @@ class MultiGraph(Graph):
         if v in self.adj[u]:
             keydict = self.adj[u][v]
             if key is None:
-                # find a unique integer key
-                # other methods might be better here?
-                key = len(keydict)
-                while key in keydict:
-                    key += 1
-            datadict = keydict.get(key, self.edge_attr_dict_factory())
+                key = new_key(keydict)
+            datadict = keydict.get(key)
+            if datadict is None:
+                datadict = self.edge_attr_dict_factory()
+                keydict[key] = datadict
             datadict.update(attr_dict)
-            keydict[key] = datadict
         else:
             # selfloops work this way without special treatment
             if key is None:
@@ -69,7 +95,11 @@ class MultiGraph(Graph):
             except AttributeError:
                 raise MiniNXError(
                     "The attr_dict argument must be a dictionary.")
-        # process ebunch
+        # process ebunch; storage and factories are looked up once
+        adj, node = self.adj, self.node
+        adjlist_factory = self.adjlist_dict_factory
+        key_factory = self.edge_key_dict_factory
+        edge_factory = self.edge_attr_dict_factory
         for e in ebunch:
             ne = len(e)
             if ne == 4:
@@ -79,15 +109,48 @@ class MultiGraph(Graph):
                 key = None
             elif ne == 2:
                 u, v = e
-                dd = {}
+                dd = None
                 key = None
             else:
                 raise MiniNXError(
                     "Edge tuple %s must be a 2-tuple, 3-tuple or 4-tuple." % (e,))
-            ddd = {}
-            ddd.update(attr_dict)
-            ddd.update(dd)
-            self.add_edge(u, v, key, ddd)
+            if u not in node:
+                adj[u] = adjlist_factory()
+                node[u] = {}
+            if v not in node:
+                adj[v] = adjlist_factory()
+                node[v] = {}
+            adj_u = adj[u]
+            keydict = adj_u.get(v)
+            if keydict is None:
+                if key is None:
+                    key = 0
+                keydict = key_factory()
+                adj_u[v] = keydict
+                adj[v][u] = keydict
+                datadict = None
+            else:
+                if key is None:
+                    key = new_key(keydict)
+                datadict = keydict.get(key)
+            if datadict is None:
+                datadict = edge_factory()
+                keydict[key] = datadict
+            if attr_dict:
+                datadict.update(attr_dict)
+            if dd:
+                datadict.update(dd)
+
+    def new_edge_key(self, u, v):
+        # the key add_edge(u, v) would give the edge
+        try:
+            keydict = self.adj[u][v]
+        except KeyError:
+            return 0
+        key = getattr(keydict, 'next_key', len(keydict))
+        while key in keydict:
+            key += 1
+        return key
 
     def remove_edge(self, u, v, key=None):
         try:
@@ -1,2 +1,5 @@
 from .tree import Tree
 from .syntax_tree import SyntaxTree
+from .diff import tree_diff
+from .symtab import Scope, SymbolTable
+from .builders import Unresolved, ProgramGraphBuilder, CallGraphBuilder, UseDefBuilder
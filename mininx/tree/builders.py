@@ -0,0 +1,162 @@
+''' Program graphs built from a SyntaxTree
+
+NOTE:
+ - a site is a tree node that refers to a name: a call statement or function
+   reference for the call graph, a variable reference for the use-def graph
+ - a site is recognized by its "kind" node attribute and names its target with
+   the "name" node attribute; subclasses may override is_site and site_name
+ - the target of a site is resolved through the symbol table of the tree; a
+   name that does not resolve targets the node Unresolved(name), one per name,
+   which never equals a node key of the tree
+ - each site adds the edge (scope, target, key=site) to a MultiDiGraph, where
+   scope is the innermost scope node that holds the site
+ - the whole tree is scanned in a single pass; after a Xformer edits the tree,
+   insert_subtree and remove_subtree update only the affected edges; sites
+   are indexed by name, so a declaration inserted with a subtree re-resolves
+   the sites of its name elsewhere (unresolved ones and ones it shadows)
+'''
+
+from mininx.classes.multidigraph import MultiDiGraph
+from mininx.exception import MiniNXError
+
+__all__ = ['Unresolved', 'ProgramGraphBuilder', 'CallGraphBuilder', 'UseDefBuilder']
+
+class Unresolved(object):
+    # target of the sites of an undeclared name
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __eq__(self, other):
+        return isinstance(other, Unresolved) and other.name == self.name
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((Unresolved, self.name))
+
+    def __reduce__(self):
+        return (Unresolved, (self.name,))
+
+    def __repr__(self):
+        return 'Unresolved(%r)' % (self.name,)
+
+class ProgramGraphBuilder(object):
+    site_kind = None
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.graph = MultiDiGraph()
+        self._sites = {}    # site node -> [(scope, target)]
+        self._targets = {}  # target -> set of site nodes
+        self._keys = {}     # site node -> name key
+        self._names = {}    # name key -> set of site nodes
+
+    def is_site(self, node):
+        try:
+            return self.tree.node[node].get('kind') == self.site_kind
+        except KeyError:
+            raise MiniNXError("The node %s is not in the tree." % (node,))
+
+    def site_name(self, node):
+        try:
+            return self.tree.node[node].get('name')
+        except KeyError:
+            raise MiniNXError("The node %s is not in the tree." % (node,))
+
+    def build(self):
+        self.graph.clear()
+        self._sites.clear()
+        self._targets.clear()
+        self._keys.clear()
+        self._names.clear()
+        self.insert_subtree(self.tree.root)
+        return self.graph
+
+    def insert_subtree(self, node):
+        tree, graph = self.tree, self.graph
+        scopes = tree.symtab.scopes
+
+        # preorder with the innermost scope carried along
+        inserted = set()
+        stack = [(node, tree.enclosing_scope(node))]
+        while stack:
+            n, scope = stack.pop()
+            inserted.add(n)
+            if n in scopes:
+                scope = n
+                if scope not in graph.succ:
+                    graph.add_node(scope)
+            if self.is_site(n):
+                self._add_site(n, scope)
+            stack.extend((c, scope) for c in tree.succ[n])
+
+        # declarations of the subtree may resolve or shadow names used elsewhere
+        decls = tree.symtab._decls
+        keys = set(key for n in inserted for scope, key in decls.get(n, ()))
+        for key in keys:
+            for site in list(self._names.get(key, ())):
+                if site not in inserted:
+                    scopes = [ scope for scope, target in self._drop_site(site) ]
+                    for scope in scopes:
+                        self._add_site(site, scope)
+
+    def _add_site(self, site, scope):
+        name = self.site_name(site)
+        if name is None:
+            return
+        symtab = self.tree.symtab
+        key = symtab._key(name)
+        target = symtab.lookup(name, scope)
+        if target is None:
+            target = Unresolved(key)
+        self.graph.add_edge(scope, target, key=site, name=name)
+        self._sites.setdefault(site, []).append((scope, target))
+        self._targets.setdefault(target, set()).add(site)
+        self._keys[site] = key
+        self._names.setdefault(key, set()).add(site)
+
+    def _drop_site(self, site):
+        # removes the edges of site; returns its (scope, target) pairs
+        graph, targets = self.graph, self._targets
+        entries = self._sites.pop(site, ())
+        for scope, target in entries:
+            if graph.has_edge(scope, target, site):
+                graph.remove_edge(scope, target, site)
+            targets[target].discard(site)
+            if not targets[target]:
+                del targets[target]
+                if target in graph.succ and not graph.succ[target] and \
+                        not graph.pred[target] and target not in self.tree.symtab.scopes:
+                    graph.remove_node(target)
+        key = self._keys.pop(site, None)
+        if key is not None:
+            names = self._names[key]
+            names.discard(site)
+            if not names:
+                del self._names[key]
+        return entries
+
+    def remove_subtree(self, nodes):
+        # nodes are the tree nodes removed by SyntaxTree.remove_subnode
+        graph, sites, targets = self.graph, self._sites, self._targets
+        removed = set(nodes)
+        for n in removed:
+            self._drop_site(n)
+            if n in graph.succ:
+                graph.remove_node(n)
+
+        # sites left in the tree whose target was removed are resolved again
+        for n in removed:
+            for site in list(targets.get(n, ())):
+                for scope, target in self._drop_site(site):
+                    if scope in self.tree.symtab.scopes:
+                        self._add_site(site, scope)
+
+class CallGraphBuilder(ProgramGraphBuilder):
+    site_kind = 'call'
+
+class UseDefBuilder(ProgramGraphBuilder):
+    site_kind = 'ref'
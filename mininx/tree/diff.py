@@ -0,0 +1,104 @@
+''' Structural diff of two syntax trees
+
+NOTE:
+ - subtrees with equal structural hashes are taken as identical and skipped
+   without being visited
+ - children of differing nodes are aligned with a longest-matching-block matcher
+   on their structural hashes, after a common prefix and suffix of identical
+   subtrees has been cut off; unmatched children are then paired in order
+   through a dict from node label to positions, and the ones left between
+   two such pairs are paired by position
+ - the edit script is a list of tuples
+     ('update', node1, node2)          node1 gets the attributes of node2
+     ('delete', node1, parent1)        the subtree of node1 is removed
+     ('insert', node2, parent1, index) the subtree of node2 is inserted at index
+   where node1/parent1 belong to the first tree and node2 to the second tree
+ - under each parent, deletes come before inserts and inserts are in increasing
+   index, so applying the script in order to the first tree gives the second
+'''
+
+from difflib import SequenceMatcher
+from collections import deque
+
+__all__ = ['tree_diff']
+
+def tree_diff(T1, T2, node1=None, node2=None):
+    node1 = T1.root if node1 is None else node1
+    node2 = T2.root if node2 is None else node2
+
+    hash1, hash2 = T1.structural_hash, T2.structural_hash
+    label1, label2 = T1.node_label, T2.node_label
+
+    script = []
+    stack = [(node1, node2)]
+    while stack:
+        n1, n2 = stack.pop()
+        if hash1(n1) == hash2(n2):
+            continue
+        if label1(n1) != label2(n2):
+            script.append(('update', n1, n2))
+
+        children1, children2 = list(T1.succ[n1]), list(T2.succ[n2])
+        hashes1 = [ hash1(c) for c in children1 ]
+        hashes2 = [ hash2(c) for c in children2 ]
+        # identical subtrees at both ends stay as they are
+        start, end1, end2 = 0, len(children1), len(children2)
+        while start < end1 and start < end2 and hashes1[start] == hashes2[start]:
+            start += 1
+        while end1 > start and end2 > start and hashes1[end1-1] == hashes2[end2-1]:
+            end1 -= 1
+            end2 -= 1
+        deletes, inserts, pairs = [], [], []
+        matcher = SequenceMatcher(None, hashes1[start:end1], hashes2[start:end2],
+                                  autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            i1, i2, j1, j2 = i1 + start, i2 + start, j1 + start, j2 + start
+            if tag == 'equal':
+                continue
+            elif tag == 'delete':
+                deletes.extend(children1[i1:i2])
+            elif tag == 'insert':
+                inserts.extend(range(j1, j2))
+            else:
+                _pair_by_label(children1[i1:i2], children2[j1:j2], j1,
+                               label1, label2, deletes, inserts, pairs)
+
+        script.extend(('delete', c, n1) for c in deletes)
+        script.extend(('insert', children2[j], n1, j) for j in inserts)
+        stack.extend(reversed(pairs))
+    return script
+
+def _hashable(label):
+    # SequenceMatcher hashes its items; unhashable labels go by repr as in
+    # structural_hash
+    try:
+        hash(label)
+    except TypeError:
+        return repr(label)
+    return label
+
+def _pair_by_label(block1, block2, offset, label1, label2, deletes, inserts, pairs):
+    positions = {}      # label -> positions in block2, increasing
+    for j, c in enumerate(block2):
+        positions.setdefault(_hashable(label2(c)), deque()).append(j)
+    # each child of block1 takes the first child of block2 with its label after
+    # the last one taken, so that the pairs keep their order
+    anchors = []
+    last = 0
+    for i, c in enumerate(block1):
+        queue = positions.get(_hashable(label1(c)))
+        while queue and queue[0] < last:
+            queue.popleft()
+        if queue:
+            last = queue.popleft() + 1
+            anchors.append((i, last - 1))
+    anchors.append((len(block1), len(block2)))
+    i1 = j1 = 0
+    for i2, j2 in anchors:
+        npair = min(i2 - i1, j2 - j1)
+        pairs.extend(zip(block1[i1:i1+npair], block2[j1:j1+npair]))
+        deletes.extend(block1[i1+npair:i2])
+        inserts.extend(range(offset + j1 + npair, offset + j2))
+        if i2 < len(block1):
+            pairs.append((block1[i2], block2[j2]))
+        i1, j1 = i2 + 1, j2 + 1
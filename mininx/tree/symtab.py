@@ -0,0 +1,163 @@
+''' Scoped symbol table for syntax trees
+
+NOTE:
+ - a scope is created for a tree node that opens a name space: the tree root,
+   program units, modules, subprograms, ...
+ - each scope keeps its own hash map of declared names and a link to its host
+   scope; the link never changes, so lookups walk an immutable chain and cost
+   one dict lookup per scope
+ - USE association adds a module scope to the search of a scope, with the
+   ONLY list and renames of the USE statement
+ - names are case-insensitive as in Fortran unless casefold is False
+ - declarations and scopes are indexed by tree node so that removing a subtree
+   drops exactly the entries that belong to it
+'''
+
+from mininx.exception import MiniNXError
+
+__all__ = ['Scope', 'SymbolTable']
+
+class Scope(object):
+    __slots__ = ('node', 'name', 'kind', 'parent', 'symbols', 'uses')
+
+    def __init__(self, node, name=None, kind=None, parent=None):
+        self.node = node
+        self.name = name
+        self.kind = kind
+        self.parent = parent
+        self.symbols = {}   # name -> declaration node
+        self.uses = []      # (module name, only names or None, {local: remote})
+
+    def chain(self):
+        scope = self
+        while scope is not None:
+            yield scope
+            scope = scope.parent
+
+class SymbolTable(object):
+
+    def __init__(self, root, casefold=True):
+        self.casefold = casefold
+        self.scopes = {}    # scope node -> Scope
+        self.modules = {}   # module name -> Scope
+        self._decls = {}    # declaration node -> [(Scope, name)]
+        self.global_scope = self.enter_scope(root, kind='global')
+
+    def _key(self, name):
+        return name.lower() if self.casefold else name
+
+    def enter_scope(self, node, parent=None, name=None, kind=None):
+        if node in self.scopes:
+            raise MiniNXError("Node %s already opens a scope." % (node,))
+        if parent is None:
+            host = None if not self.scopes else self.global_scope
+        else:
+            host = self.scope(parent)
+        scope = Scope(node, name, kind, host)
+        self.scopes[node] = scope
+        if kind == 'module' and name is not None:
+            self.modules[self._key(name)] = scope
+        return scope
+
+    def scope(self, node):
+        try:
+            return self.scopes[node]
+        except KeyError:
+            raise MiniNXError("Node %s does not open a scope." % (node,))
+
+    def declare(self, scope_node, name, decl_node):
+        scope = self.scope(scope_node)
+        key = self._key(name)
+        old = scope.symbols.get(key)
+        if old is not None:
+            self._unindex(old, scope, key)
+        scope.symbols[key] = decl_node
+        self._decls.setdefault(decl_node, []).append((scope, key))
+
+    def undeclare(self, scope_node, name):
+        scope = self.scope(scope_node)
+        key = self._key(name)
+        try:
+            decl_node = scope.symbols.pop(key)
+        except KeyError:
+            raise MiniNXError("Name %s is not declared in scope %s." % (name, scope_node))
+        self._unindex(decl_node, scope, key)
+        return decl_node
+
+    def use(self, scope_node, module, only=None, rename=None):
+        scope = self.scope(scope_node)
+        if only is not None:
+            only = set(self._key(n) for n in only)
+        renames = {}
+        if rename:
+            for local, remote in rename.items():
+                renames[self._key(local)] = self._key(remote)
+        scope.uses.append((self._key(module), only, renames))
+
+    def lookup(self, name, scope_node=None):
+        scope = self.global_scope if scope_node is None else self.scope(scope_node)
+        key = self._key(name)
+        for s in scope.chain():
+            decl = self._resolve(s, key, set())
+            if decl is not None:
+                return decl
+
+    def _resolve(self, scope, key, visited):
+        decl = scope.symbols.get(key)
+        if decl is not None:
+            return decl
+        visited.add(scope.node)
+        for module, only, renames in scope.uses:
+            if key in renames:
+                remote = renames[key]
+            elif only is not None:
+                if key not in only:
+                    continue
+                remote = key
+            elif key in renames.values():
+                continue    # renamed entities are not visible by the original name
+            else:
+                remote = key
+            mod = self.modules.get(module)
+            if mod is None or mod.node in visited:
+                continue
+            decl = self._resolve(mod, remote, visited)
+            if decl is not None:
+                return decl
+
+    def remove_nodes(self, nodes):
+        # drop scopes and declarations that belong to removed tree nodes
+        for n in nodes:
+            for scope, key in self._decls.pop(n, ()):
+                if scope.symbols.get(key) == n:
+                    del scope.symbols[key]
+            scope = self.scopes.pop(n, None)
+            if scope is not None:
+                if scope.kind == 'module' and scope.name is not None:
+                    self.modules.pop(self._key(scope.name), None)
+                for decl_node in scope.symbols.values():
+                    self._unindex(decl_node, scope, None)
+
+    def replace_node(self, old, new, scopes=None):
+        # declaration node old is merged into the structurally identical new, or
+        # only in the given scope nodes when old stays in the tree as well
+        entries = self._decls.pop(old, ())
+        if scopes is not None:
+            scopes = set(scopes)
+            kept = [(scope, key) for scope, key in entries if scope.node not in scopes]
+            entries = [(scope, key) for scope, key in entries if scope.node in scopes]
+            if kept:
+                self._decls[old] = kept
+        for scope, key in entries:
+            if scope.symbols.get(key) == old:
+                scope.symbols[key] = new
+                self._decls.setdefault(new, []).append((scope, key))
+
+    def _unindex(self, decl_node, scope, key):
+        entries = self._decls.get(decl_node)
+        if entries is None:
+            return
+        entries[:] = [(s, k) for s, k in entries
+                      if not (s is scope and (key is None or k == key))]
+        if not entries:
+            del self._decls[decl_node]
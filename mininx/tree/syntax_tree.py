@@ -1,4 +1,8 @@
+from copy import copy
+
 from tree import Tree
+from symtab import SymbolTable
+from mininx.exception import MiniNXError
 
 class SyntaxTree(Tree):
     '''
@@ -9,6 +13,269 @@ class SyntaxTree(Tree):
        the original formatting can be recovered, while AbstractSyntaxTree is not
      - May inherit from multiple parent class for adding generic the recovery feature
      - A parser may have multiple level parsing: (multiple)line-level, statement level, expression level, ...
-     - Reader class read external information source with a particular format or soruce types and 
+     - Reader class read external information source with a particular format or soruce types and
        convert it to the format that a parser can parse
+     - every subtree has a Merkle-style structural hash built from node attributes and
+       the hashes of its subnodes; node keys themselves do not take part in it
+     - in hashcons mode, seal(node) interns the finished subtree at node: structurally
+       identical subtrees are shared by all of their parents and structural equality
+       becomes an identity test; seal returns the canonical node, which may replace
+       node in the tree, so a subtree is sealed once it is built, not while it is
+       built top-down
+     - a shared subtree is copied on write: unshare_path(node, path) copies the
+       shared nodes on path, the nodes from the root down to node, and returns the
+       private node to edit; the other parents keep the old subtree. An edit below
+       a shared node does not know which of its occurrences is meant and raises
+       MiniNXError; update_subnode copies a shared subnode under the given parent
+     - declarations of a copied node move to the copy in the scopes on its path
+     - edited nodes and their ancestors lose their interned identity until the
+       subtree is sealed again; without hashcons an edit only drops the cached
+       hashes of the ancestors that have one
+     - a DiGraph can not hold the same subnode twice under one parent, so identical
+       siblings are left unshared
+     - symtab holds the scopes and declarations of the tree; a Reader fills it while
+       building the tree and removing a subtree drops its scopes and declarations
 '''
+
+    def __init__(self, data=None, hashcons=False, **attr):
+        self.hashcons = hashcons
+        self._shash = {}        # node -> structural hash
+        self._interned = {}     # intern key -> canonical node
+        self._intern_key = {}   # canonical node -> intern key
+        self._ncopies = 0       # serial of node keys made by copy_node
+        super(SyntaxTree, self).__init__(data, **attr)
+        self.symtab = SymbolTable(self.root)
+
+    def append_subnode(self, subnode, parent, data=None, **attr):
+        self._check_parent(parent)
+        parent = self._modify(parent)
+        super(SyntaxTree, self).append_subnode(subnode, parent, data, **attr)
+
+    def insert_subnode(self, index, subnode, parent, data=None, **attr):
+        self._check_parent(parent)
+        parent = self._modify(parent)
+        super(SyntaxTree, self).insert_subnode(index, subnode, parent, data, **attr)
+
+    def remove_subnode(self, subnode, parent):
+        self._check_edge(subnode, parent)
+        parent = self._modify(parent)
+        removed = super(SyntaxTree, self).remove_subnode(subnode, parent)
+        self._forget(removed)
+        self.symtab.remove_nodes(removed)
+        return removed
+
+    def update_subnode(self, subnode, parent, data=None, **attr):
+        self._check_edge(subnode, parent)
+        parent = self._modify(parent)
+        subnode = self.unshare(subnode, parent)
+        self._uncache(subnode)
+        super(SyntaxTree, self).update_subnode(subnode, parent, data, **attr)
+        return subnode
+
+    def node_label(self, node):
+        # the part of the structural identity that belongs to the node itself
+        return tuple(sorted(self.node[node].items()))
+
+    def is_internable(self, node):
+        # scope nodes keep their identity
+        return node is not self.root and node not in self.symtab.scopes
+
+    def enclosing_scope(self, node):
+        if node not in self.pred:
+            raise MiniNXError("The node %s is not in the tree." % (node,))
+        scopes = self.symtab.scopes
+        while node not in scopes:
+            node = self._parent_of(node)
+            if node is None:
+                raise MiniNXError("Node is not in any scope.")
+        return node
+
+    def lookup(self, name, node=None):
+        node = self.root if node is None else node
+        return self.symtab.lookup(name, self.enclosing_scope(node))
+
+    def copy_node(self, node):
+        # a new node key for a copy of node; keys that copy() returns as they
+        # are (str, int, tuple, ...) or that equal a node of the tree become
+        # (node, serial)
+        newnode = copy(node)
+        while newnode is node or newnode in self.succ:
+            self._ncopies += 1
+            newnode = (node, self._ncopies)
+        return newnode
+
+    def structural_hash(self, node=None):
+        node = self.root if node is None else node
+        shash = self._shash
+        if node in shash:
+            return shash[node]
+        # postorder that lists the children of a node once, skips the listing
+        # for leaves and does not enter subtrees whose hash is cached
+        succ, node_label = self.succ, self.node_label
+        stack = [(node, None)]
+        while stack:
+            n, children = stack.pop()
+            if children is None:
+                nbrs = succ[n]
+                if nbrs:
+                    children = list(nbrs)
+                    stack.append((n, children))
+                    stack.extend([ (c, None) for c in children if c not in shash ])
+                    continue
+                children = ()
+            label = node_label(n)
+            key = tuple(map(shash.__getitem__, children))
+            try:
+                shash[n] = hash((label, key))
+            except TypeError:
+                shash[n] = hash((repr(label), key))
+        return shash[node]
+
+    def subtree_equal(self, node1, node2, other=None):
+        other = self if other is None else other
+        if other is self and node1 == node2:
+            return True
+        if self.structural_hash(node1) != other.structural_hash(node2):
+            return False
+        # equal hashes: confirm to rule out collisions
+        stack = [(node1, node2)]
+        while stack:
+            n1, n2 = stack.pop()
+            if other is self and n1 == n2:
+                continue
+            c1, c2 = list(self.succ[n1]), list(other.succ[n2])
+            if len(c1) != len(c2) or self.node_label(n1) != other.node_label(n2):
+                return False
+            stack.extend(zip(c1, c2))
+        return True
+
+    def intern(self, node=None):
+        node = self.root if node is None else node
+        interned, intern_key = self._interned, self._intern_key
+        replaced = {}
+
+        # postorder so that subnodes are canonical before their parents
+        order = []
+        stack = [(node, self._parent_of(node), False)]
+        while stack:
+            n, parent, expanded = stack.pop()
+            if expanded:
+                order.append((n, parent))
+            else:
+                stack.append((n, parent, True))
+                stack.extend((c, n, False) for c in reversed(list(self.succ[n])))
+
+        for n, parent in order:
+            if n in intern_key or n not in self.succ or not self.is_internable(n):
+                continue
+            try:
+                key = (self.node_label(n), tuple(self.succ[n]))
+                canon = interned.get(key)
+            except TypeError: # unhashable attributes are never shared
+                continue
+            if canon is None:
+                interned[key] = n
+                intern_key[n] = key
+            elif parent is not None and canon not in self.succ[parent]:
+                self._replace_child(parent, n, canon)
+                self.symtab.replace_node(n, canon)
+                self._forget(self._prune(n))
+                replaced[n] = canon
+        return replaced.get(node, node)
+
+    def seal(self, node=None):
+        if not self.hashcons:
+            return self.root if node is None else node
+        return self.intern(node)
+
+    def unshare(self, subnode, parent):
+        self._check_edge(subnode, parent)
+        if not self.is_shared(subnode):
+            self._deintern(subnode)
+            return subnode
+        scopes = self.symtab.scopes
+        return self._unshare(subnode, parent,
+                             [n for n in self._path(parent) if n in scopes])
+
+    def unshare_path(self, node, path=None):
+        # path: the nodes from the root (or an unshared node) down to node
+        path = self._path(node) if path is None else list(path)
+        if not path or path[-1] != node:
+            raise MiniNXError("The path does not end at node %s." % (node,))
+        if self.is_shared(path[0]):
+            raise MiniNXError("The path starts at the shared node %s." % (path[0],))
+        scopes = []
+        for i in range(1, len(path)):
+            self._check_edge(path[i], path[i - 1])
+            if path[i - 1] in self.symtab.scopes:
+                scopes.append(path[i - 1])
+            path[i] = self._unshare(path[i], path[i - 1], scopes)
+        for n in path:
+            self._deintern(n)
+            self._shash.pop(n, None)
+        return path[-1]
+
+    def is_shared(self, node):
+        return len(self.pred[node]) > 1
+
+    def _parent_of(self, node):
+        for parent in self.pred[node]:
+            return parent
+
+    def _unshare(self, subnode, parent, scopes):
+        # scopes: the scope nodes above parent whose declarations follow the copy
+        if len(self.pred[subnode]) < 2:
+            self._deintern(subnode)
+            return subnode
+        newnode = self.copy_node(subnode)
+        self.add_node(newnode, dict(self.node[subnode]))
+        for child, datadict in self.succ[subnode].items():
+            self.add_edge(newnode, child, dict(datadict))
+        self._replace_child(parent, subnode, newnode)
+        self.symtab.replace_node(subnode, newnode, scopes)
+        return newnode
+
+    def _path(self, node):
+        path = [node]
+        parent = self._parent_of(node)
+        while parent is not None:
+            path.append(parent)
+            parent = self._parent_of(parent)
+        path.reverse()
+        return path
+
+    def _modify(self, node):
+        # node is about to change: drops the hashes and interned identities
+        # that depend on it
+        if not self.hashcons:
+            self._uncache_up(node)
+            return node
+        path = self._path(node)
+        for n in path:
+            if self.is_shared(n):
+                raise MiniNXError("The node %s is shared; edit the node that "
+                                  "unshare_path(node, path) returns." % (n,))
+        for n in path:
+            self._deintern(n)
+        self._uncache_up(node)
+        return node
+
+    def _uncache_up(self, node):
+        # a node without a cached hash has no ancestor with one
+        shash = self._shash
+        while node in shash:
+            del shash[node]
+            node = self._parent_of(node)
+
+    def _uncache(self, node):
+        self._shash.pop(node, None)
+
+    def _deintern(self, node):
+        key = self._intern_key.pop(node, None)
+        if key is not None:
+            del self._interned[key]
+
+    def _forget(self, nodes):
+        for n in nodes:
+            self._deintern(n)
+            self._shash.pop(n, None)
@@ -1,32 +1,123 @@
 from mininx.classes.ordered import OrderedDiGraph
+from mininx.exception import MiniNXError, MiniNXNotImplemented
 
 class Tree(OrderedDiGraph):
     '''
 NOTE:
  - create a root node when a tree is created
  - adding subnode is the same to adding an edge
+ - subnodes of a node are ordered by the insertion order of succ
+ - removing a subnode removes its whole subtree
 '''
 
     def __init__(self, data=None, **attr):
-        super(self, Tree).__init__(data, **attr)
+        super(Tree, self).__init__(data, **attr)
 
         self.root = object()
         self.add_node(self.root)
 
     def append_subnode(self, subnode, parent, data=None, **attr):
-        pass
+        self._check_parent(parent)
+        self._check_orphan(subnode)
+        self.add_node(subnode, data, **attr)
+        self.add_edge(parent, subnode)
 
     def insert_subnode(self, index, subnode, parent, data=None, **attr):
-        pass
+        self._check_parent(parent)
+        self._check_orphan(subnode)
+        self.add_node(subnode, data, **attr)
+        self._insert_child(parent, index, subnode, self.edge_attr_dict_factory())
 
     def remove_subnode(self, subnode, parent):
-        pass
+        self._check_edge(subnode, parent)
+        self.remove_edge(parent, subnode)
+        return self._prune(subnode)
 
     def update_subnode(self, subnode, parent, data=None, **attr):
-        pass
+        self._check_edge(subnode, parent)
+        if data is not None:
+            self.node[subnode].update(data)
+        self.node[subnode].update(attr)
+
+    def batch(self):
+        # subnode edits check the tree as it is, not a pending edit log
+        raise MiniNXNotImplemented('not implemented for Tree type')
 
     def index_subnode(self, subnode, parent):
-        pass
+        self._check_edge(subnode, parent)
+        for index, child in enumerate(self.succ[parent]):
+            if child == subnode:
+                return index
+
+    def subnodes(self, node):
+        try:
+            return iter(self.succ[node])
+        except KeyError:
+            raise MiniNXError("The node %s is not in the tree." % (node,))
+
+    def preorder(self, node=None):
+        stack = [self.root if node is None else node]
+        while stack:
+            n = stack.pop()
+            yield n
+            stack.extend(reversed(list(self.succ[n])))
+
+    def postorder(self, node=None):
+        # iterative to survive very deep syntax trees
+        stack = [(self.root if node is None else node, False)]
+        while stack:
+            n, expanded = stack.pop()
+            if expanded:
+                yield n
+            else:
+                stack.append((n, True))
+                stack.extend((c, False) for c in reversed(list(self.succ[n])))
+
+    def _check_parent(self, parent):
+        if parent not in self.succ:
+            raise MiniNXError("The parent %s is not in the tree." % (parent,))
+
+    def _check_orphan(self, subnode):
+        if subnode in self.pred and self.pred[subnode]:
+            raise MiniNXError("The subnode %s already has a parent." % (subnode,))
+
+    def _check_edge(self, subnode, parent):
+        if parent not in self.succ or subnode not in self.succ[parent]:
+            raise MiniNXError("The node %s is not a subnode of %s." % (subnode, parent))
+
+    def _insert_child(self, parent, index, child, datadict):
+        # succ is ordered; rebuild it to place child at index
+        children = self.succ[parent]
+        items = list(children.items())
+        items.insert(index, (child, datadict))
+        children.clear()
+        for c, d in items:
+            children[c] = d
+        self.pred[child][parent] = datadict
+
+    def _replace_child(self, parent, old, new):
+        children = self.succ[parent]
+        items = [((new if c == old else c), d) for c, d in children.items()]
+        datadict = children[old]
+        children.clear()
+        for c, d in items:
+            children[c] = d
+        del self.pred[old][parent]
+        self.pred[new][parent] = datadict
+
+    def _prune(self, node):
+        # remove node and every descendant left without a parent
+        removed = []
+        stack = [node]
+        while stack:
+            n = stack.pop()
+            if n is self.root or n not in self.pred or self.pred[n]:
+                continue
+            stack.extend(self.succ[n])
+            self.remove_node(n)
+            removed.append(n)
+        return removed
+
 '''
 tree functions
 
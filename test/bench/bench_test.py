@@ -0,0 +1,380 @@
+''' Danata benchmark tests
+
+NOTE:
+ - generate_corpus writes a deterministic synthetic Fortran corpus; the same
+   parameters always give the same bytes
+ - modules USE only modules of a lower number so that the corpus has a valid
+   compile order; the remaining files hold external subroutines
+ - BenchTest clones a corpus: read builds a line-level SyntaxTree nested by
+   program units and blocks, write walks the tree back to files and verify
+   compares the bytes
+ - corpus size is selected with -o size=1kb|1mb|100mb|1gb (or any <n>kb/mb/gb);
+   nfiles, file_size, depth, modules, fanout and seed override the preset
+ - GraphStressTest runs one writer thread against reader threads on a
+   ConcurrentDiGraph: read checks succ/pred agreement under the read lock,
+   xform checks epoch snapshots; -o nodes, edges, writes, readers and seed set
+   the load
+'''
+
+from __future__ import print_function
+import io
+import os
+import re
+import time
+import random
+import shutil
+import filecmp
+import inspect
+import tempfile
+import threading
+from itertools import count
+
+from classes import DntTest
+from classes.dnt_test import peak_rss
+from mininx.tree import SyntaxTree
+from mininx import DiGraph, ConcurrentDiGraph
+
+UNITS = { 'kb': 1 << 10, 'mb': 1 << 20, 'gb': 1 << 30 }
+MAX_FILE_SIZE = 1 << 20
+INDENT = '  '
+
+BLOCK_BEGIN = re.compile(r'^\s*(module(?!\s+procedure)|program|subroutine|function|do\b|select\b|if\b.*\bthen\s*$)', re.I)
+BLOCK_END = re.compile(r'^\s*end\b', re.I)
+
+def parse_size(text):
+    m = re.match(r'^\s*(\d+(?:\.\d+)?)\s*([kmg]b)?\s*$', text.lower())
+    if m is None:
+        raise ValueError('Unknown corpus size: %s'%text)
+    return int(float(m.group(1)) * UNITS.get(m.group(2), 1))
+
+def corpus_params(options):
+    total = parse_size(options.get('size', '1kb'))
+    file_size = int(options.get('file_size', min(total, MAX_FILE_SIZE // 4 if total <= 256 * UNITS['mb'] else MAX_FILE_SIZE)))
+    nfiles = int(options.get('nfiles', max(1, (total + file_size - 1) // file_size)))
+    return { 'nfiles': nfiles, 'file_size': file_size, 'depth': int(options.get('depth', 3)),
+        'nmodules': int(options.get('modules', max(1, nfiles // 4))),
+        'fanout': int(options.get('fanout', 3)), 'seed': int(options.get('seed', 0)) }
+
+class CorpusGenerator(object):
+
+    def __init__(self, depth, fanout, seed):
+        self.depth = depth
+        self.fanout = fanout
+        # random() is the same across Python versions, randint is not
+        self.rng = random.Random(seed)
+
+    def randint(self, n):
+        return int(self.rng.random() * n)
+
+    def uses(self, nmodules, indent):
+        nuse = min(self.fanout, nmodules)
+        start = self.randint(nmodules) if nmodules else 0
+        return [ '%suse mod_%d\n'%(indent, (start + i) % nmodules) for i in range(nuse) ]
+
+    def block(self, level, indent, lines):
+        for istmt in range(1 + self.randint(3)):
+            lines.append('%sx(%d) = x(%d) * %d.0 + %d.5\n'%(indent, 1 + self.randint(8),
+                1 + self.randint(8), 1 + self.randint(9), self.randint(10)))
+        if level > self.depth:
+            return
+        if self.randint(2):
+            lines.append('%sdo i%d = 1, n\n'%(indent, level))
+            self.block(level + 1, indent + INDENT, lines)
+            lines.append('%send do\n'%indent)
+        else:
+            lines.append('%sif (x(%d) > %d.0) then\n'%(indent, 1 + self.randint(8), self.randint(10)))
+            self.block(level + 1, indent + INDENT, lines)
+            lines.append('%send if\n'%indent)
+
+    def subroutine(self, name, nmodules, indent, lines):
+        body = indent + INDENT
+        lines.append('%ssubroutine %s(n, x)\n'%(indent, name))
+        lines.extend(self.uses(nmodules, body))
+        lines.append('%sinteger, intent(in) :: n\n'%body)
+        lines.append('%sreal, intent(inout) :: x(n)\n'%body)
+        lines.append('%sinteger :: %s\n'%(body, ', '.join('i%d'%(i+1) for i in range(self.depth + 1))))
+        self.block(1, body, lines)
+        lines.append('%send subroutine %s\n'%(indent, name))
+
+    def source(self, ifile, file_size, nmodules):
+        lines = []
+        size = 0
+        ismodule = ifile < nmodules
+        indent = INDENT if ismodule else ''
+        if ismodule:
+            lines.append('module mod_%d\n'%ifile)
+            lines.extend(self.uses(ifile, INDENT))
+            lines.append('%simplicit none\n'%INDENT)
+            lines.append('%sreal :: v_%d = %d.0\n'%(INDENT, ifile, ifile))
+            lines.append('contains\n')
+        isub = 0
+        while isub == 0 or size < file_size:
+            start = len(lines)
+            self.subroutine('sub_%d_%d'%(ifile, isub), ifile if ismodule else nmodules, indent, lines)
+            size += sum(len(line) for line in lines[start:])
+            isub += 1
+        if ismodule:
+            lines.append('end module mod_%d\n'%ifile)
+        return ''.join(lines)
+
+def generate_corpus(outdir, nfiles=1, file_size=1024, depth=3, nmodules=1, fanout=3, seed=0):
+    generator = CorpusGenerator(depth, fanout, seed)
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
+    paths = []
+    for ifile in range(nfiles):
+        path = os.path.join(outdir, 'src_%06d.f90'%ifile)
+        with io.open(path, 'w', newline='') as f:
+            f.write(u'%s'%generator.source(ifile, file_size, nmodules))
+        paths.append(path)
+    return paths
+
+def current_rss():
+    # resident set size in KB; falls back to the peak of this process without /proc
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (IOError, OSError, ValueError):
+        return peak_rss()[0]
+
+def read_source(tree, parent, path, nodeid):
+    filenode = next(nodeid)
+    tree.append_subnode(filenode, parent, path=os.path.basename(path))
+    stack = [filenode]
+    with io.open(path, 'r', newline='') as f:
+        for line in f:
+            node = next(nodeid)
+            tree.append_subnode(node, stack[-1], text=line)
+            if BLOCK_END.match(line):
+                if len(stack) > 1:
+                    stack.pop()
+            elif BLOCK_BEGIN.match(line):
+                stack.append(node)
+    return filenode
+
+def write_source(tree, filenode, outdir):
+    path = os.path.join(outdir, tree.node[filenode]['path'])
+    with io.open(path, 'w', newline='') as f:
+        for node in tree.preorder(filenode):
+            if node != filenode:
+                f.write(tree.node[node]['text'])
+    return path
+
+class BenchTest(DntTest):
+
+    def preprocess(self, myname, result):
+        self.params = corpus_params(self.OPTIONS)
+        self.set_status(result, myname, self.PASSED)
+        return result
+
+    def mkworkdir(self, myname, result):
+        if self.WORK_DIR:
+            self.workdir = os.path.abspath(os.path.join(self.WORK_DIR, self.TEST_ID.replace('/', '_')))
+            if os.path.exists(self.workdir):
+                shutil.rmtree(self.workdir)
+            os.makedirs(self.workdir)
+        else:
+            self.workdir = tempfile.mkdtemp(prefix='dnt_bench_')
+        self.srcdir = os.path.join(self.workdir, 'src')
+        self.outdir = os.path.join(self.workdir, 'out')
+        os.makedirs(self.outdir)
+        self.set_status(result, myname, self.PASSED)
+        return result
+
+    def config(self, myname, result):
+        params = self.params
+        generator = inspect.getsourcefile(CorpusGenerator)
+        self.cached_artifact('corpus', [generator, sorted(params.items())], self.srcdir,
+            lambda dest: generate_corpus(dest, **params))
+        self.sources = sorted(os.path.join(self.srcdir, name) for name in os.listdir(self.srcdir))
+        self.nbytes = sum(os.path.getsize(path) for path in self.sources)
+        self.set_status(result, myname, self.PASSED)
+        return result
+
+    def read(self, myname, result):
+        rss0 = current_rss()
+        start = time.time()
+        self.tree = SyntaxTree()
+        nodeid = count()
+        self.filenodes = [ read_source(self.tree, self.tree.root, path, nodeid) for path in self.sources ]
+        elapsed = time.time() - start
+        tree_kb = max(current_rss() - rss0, 0)
+
+        result[myname]['nbytes'] = self.nbytes
+        result[myname]['nnodes'] = self.tree.number_of_nodes()
+        result[myname]['mb_per_s'] = self.nbytes / float(1 << 20) / elapsed if elapsed else 0.0
+        result[myname]['tree_kb'] = tree_kb
+        result[myname]['kb_per_source_kb'] = tree_kb / (self.nbytes / 1024.0) if self.nbytes else 0.0
+        self.set_status(result, myname, self.PASSED)
+        return result
+
+    def write(self, myname, result):
+        start = time.time()
+        self.outputs = [ write_source(self.tree, filenode, self.outdir) for filenode in self.filenodes ]
+        elapsed = time.time() - start
+
+        result[myname]['nbytes'] = self.nbytes
+        result[myname]['mb_per_s'] = self.nbytes / float(1 << 20) / elapsed if elapsed else 0.0
+        self.set_status(result, myname, self.PASSED)
+        return result
+
+    def verify(self, myname, result):
+        for src, out in zip(self.sources, self.outputs):
+            if not filecmp.cmp(src, out, shallow=False):
+                self.set_status(result, myname, self.FAILED, 'Cloned file differs: %s'%os.path.basename(src))
+                return result
+        self.set_status(result, myname, self.PASSED)
+        return result
+
+    def rmdir(self, myname, result):
+        self.tree = None
+        if not self.LEAVE_TEMP:
+            shutil.rmtree(self.workdir)
+        self.set_status(result, myname, self.PASSED)
+        return result
+
+    def postprocess(self, myname, result):
+        print('[%.2f MB: read %.2f MB/s, write %.2f MB/s, tree %.1f KB/source KB] '%(self.nbytes / float(1 << 20),
+            result['read_task']['mb_per_s'], result['write_task']['mb_per_s'],
+            result['read_task']['kb_per_source_kb']), end='')
+        self.set_status(result, myname, self.PASSED)
+        return result
+
+def stress_params(options):
+    return { 'nodes': int(options.get('nodes', 200)), 'edges': int(options.get('edges', 1000)),
+        'writes': int(options.get('writes', 5000)), 'readers': int(options.get('readers', 4)),
+        'seed': int(options.get('seed', 0)) }
+
+def graph_edits(nodes, nedits, seed):
+    # deterministic add_edge/remove_edge/remove_node sequence
+    rng = random.Random(seed)
+    edits = []
+    for i in range(nedits):
+        u, v, op = int(rng.random() * nodes), int(rng.random() * nodes), rng.random()
+        if op < 0.6:
+            edits.append(('add_edge', u, v))
+        elif op < 0.95:
+            edits.append(('remove_edge', u, v))
+        else:
+            edits.append(('remove_node', u))
+    return edits
+
+def apply_edit(G, edit):
+    if edit[0] == 'remove_edge':
+        if G.has_edge(*edit[1:]):
+            G.remove_edge(*edit[1:])
+    elif edit[0] == 'remove_node':
+        if edit[1] in G:
+            G.remove_node(edit[1])
+    else:
+        G.add_edge(*edit[1:])
+
+def mismatches(G):
+    # edges in succ but not in pred and the other way around
+    succ, pred = G.succ, G.pred
+    nbad = 0
+    for u, nbrs in succ.items():
+        for v in nbrs:
+            if v not in pred or u not in pred[v]:
+                nbad += 1
+    for v, nbrs in pred.items():
+        for u in nbrs:
+            if u not in succ or v not in succ[u]:
+                nbad += 1
+    return nbad
+
+def stress(G, edits, nreaders, read):
+    # one writer applies edits while readers call read(G) until it is done
+    done = threading.Event()
+    reads = [0] * nreaders
+    errors = [0] * nreaders
+
+    def writer():
+        try:
+            for edit in edits:
+                apply_edit(G, edit)
+        finally:
+            done.set()
+
+    def reader(ireader):
+        while not done.is_set():
+            try:
+                errors[ireader] += read(G)
+            except RuntimeError: # dict changed size during iteration
+                errors[ireader] += 1
+            reads[ireader] += 1
+
+    threads = [ threading.Thread(target=reader, args=(i,)) for i in range(nreaders) ]
+    threads.append(threading.Thread(target=writer))
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.time() - start, sum(reads), sum(errors)
+
+def locked_read(G):
+    with G.reading():
+        return mismatches(G)
+
+def snapshot_read(G):
+    return mismatches(G.snapshot())
+
+class GraphStressTest(DntTest):
+
+    def preprocess(self, myname, result):
+        self.params = stress_params(self.OPTIONS)
+        self.set_status(result, myname, self.PASSED)
+        return result
+
+    def config(self, myname, result):
+        params = self.params
+        rng = random.Random(params['seed'])
+        nodes = params['nodes']
+        self.initial = [ (int(rng.random() * nodes), int(rng.random() * nodes)) for i in range(params['edges']) ]
+        self.edits = graph_edits(nodes, params['writes'], params['seed'] + 1)
+        self.expected = DiGraph(self.initial)
+        for edit in self.edits:
+            apply_edit(self.expected, edit)
+        self.set_status(result, myname, self.PASSED)
+        return result
+
+    def _stress(self, myname, result, read):
+        G = ConcurrentDiGraph(self.initial)
+        elapsed, nreads, nerrors = stress(G, self.edits, self.params['readers'], read)
+        self.graphs.append(G)
+        result[myname]['reads'] = nreads
+        result[myname]['mismatches'] = nerrors
+        result[myname]['reads_per_s'] = nreads / elapsed if elapsed else 0.0
+        result[myname]['writes_per_s'] = len(self.edits) / elapsed if elapsed else 0.0
+        self.set_status(result, myname, self.PASSED)
+        return result
+
+    def read(self, myname, result):
+        self.graphs = []
+        return self._stress(myname, result, locked_read)
+
+    def xform(self, myname, result):
+        return self._stress(myname, result, snapshot_read)
+
+    def verify(self, myname, result):
+        for task in ('read_task', 'xform_task'):
+            if result[task]['mismatches']:
+                self.set_status(result, myname, self.FAILED, '%s: %d succ/pred mismatches seen by readers'%(task,
+                    result[task]['mismatches']))
+                return result
+        expected = sorted(self.expected.edges())
+        for G in self.graphs:
+            if mismatches(G) or sorted(G.edges()) != expected:
+                self.set_status(result, myname, self.FAILED, 'Final graph differs from the serial result.')
+                return result
+        self.set_status(result, myname, self.PASSED)
+        return result
+
+    def postprocess(self, myname, result):
+        print('[%d readers: locked %.0f reads/s %.0f writes/s, snapshot %.0f reads/s %.0f writes/s] '%(
+            self.params['readers'], result['read_task']['reads_per_s'], result['read_task']['writes_per_s'],
+            result['xform_task']['reads_per_s'], result['xform_task']['writes_per_s']), end='')
+        self.graphs = None
+        self.set_status(result, myname, self.PASSED)
+        return result
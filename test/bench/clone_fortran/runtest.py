@@ -0,0 +1,4 @@
+from bench_test import BenchTest
+
+class Test(BenchTest):
+    pass
@@ -0,0 +1,4 @@
+from bench_test import GraphStressTest
+
+class Test(GraphStressTest):
+    pass
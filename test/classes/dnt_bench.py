@@ -0,0 +1,90 @@
+''' Danata benchmark helpers '''
+
+from __future__ import print_function
+import sys
+import json
+import time
+import platform
+import multiprocessing
+
+def percentile(sorted_samples, q):
+    # linear interpolation between closest ranks
+    if not sorted_samples:
+        return 0.0
+    pos = (len(sorted_samples) - 1) * q
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_samples) - 1)
+    return sorted_samples[lo] + (sorted_samples[hi] - sorted_samples[lo]) * (pos - lo)
+
+def summarize(samples):
+    s = sorted(samples)
+    return { 'median': percentile(s, 0.5), 'iqr': percentile(s, 0.75) - percentile(s, 0.25),
+        'min': s[0] if s else 0.0, 'max': s[-1] if s else 0.0 }
+
+def machine_info():
+    try:
+        ncpus = multiprocessing.cpu_count()
+    except NotImplementedError:
+        ncpus = 0
+    return { 'node': platform.node(), 'machine': platform.machine(), 'system': platform.system(),
+        'processor': platform.processor(), 'ncpus': ncpus }
+
+def python_info():
+    return '%s %s'%(platform.python_implementation(), platform.python_version())
+
+def bench_records(testid, samples, options, repeat, warmup):
+    machine = machine_info()
+    python = python_info()
+    now = time.time()
+    records = []
+    for taskname, taskdata in samples.items():
+        record = { 'test': testid, 'task': taskname, 'samples': taskdata, 'repeat': repeat,
+            'warmup': warmup, 'options': options, 'machine': machine, 'python': python, 'time': now }
+        record.update(summarize(taskdata))
+        records.append(record)
+    return records
+
+def write_records(path, records):
+    with open(path, 'a') as f:
+        for record in records:
+            f.write(json.dumps(record, sort_keys=True) + '\n')
+
+def bench_key(record):
+    options = ','.join('%s=%s'%item for item in sorted(record.get('options', {}).items()))
+    return (record['test'], record['task'], options)
+
+def load_baseline(path):
+    # the latest record of a test, task and options wins
+    baseline = {}
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                record = json.loads(line)
+                baseline[bench_key(record)] = record
+    return baseline
+
+def compare(records, baseline, threshold):
+    regressions = []
+    for record in records:
+        base = baseline.get(bench_key(record))
+        if base is None or base['median'] <= 0:
+            continue
+        ratio = record['median'] / base['median']
+        if ratio > 1.0 + threshold:
+            regressions.append((record['test'], record['task'], base['median'], record['median'], ratio))
+    return regressions
+
+def print_bench(records, regressions, out=sys.stdout):
+    print( '', file=out )
+    print( '*********** BENCHMARK ***********', file=out )
+    print( '', file=out )
+    print( '  %-20s %12s %12s  %s'%('task', 'median(s)', 'iqr(s)', 'test'), file=out )
+    for record in sorted(records, key=lambda r: (r['test'], r['task'])):
+        print( '  %-20s %12.4f %12.4f  %s'%(record['task'], record['median'], record['iqr'], record['test']), file=out )
+    if regressions:
+        print( '', file=out )
+        print( 'Slowed down beyond threshold:', file=out )
+        for testid, taskname, base, now, ratio in regressions:
+            print( '  %-20s %10.4f -> %10.4f s (x%.2f)  %s'%(taskname, base, now, ratio, testid), file=out )
+    print( '', file=out )
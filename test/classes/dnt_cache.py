@@ -0,0 +1,185 @@
+''' Danata artifact cache
+
+NOTE:
+ - an entry holds a file or directory tree produced by a test task: downloaded
+   inputs, configured source trees, compiled reference binaries, ...
+ - entries are keyed by test id, artifact name and a hash of the inputs; the
+   test id is escaped so that it never holds a '-' and ends at the first one
+ - a hit hardlinks the cached files into the working directory, falling back
+   to copies across file systems; cached files are read-only so that a test
+   can not change them through a link
+ - least recently used entries are evicted when the cache exceeds its size
+'''
+
+import os
+import stat
+import shutil
+import hashlib
+import tempfile
+
+try:
+    from urllib2 import urlopen
+except ImportError:
+    from urllib.request import urlopen
+
+try:
+    text_type = unicode
+except NameError:
+    text_type = str
+
+ENTRY_DATA = 'data'
+
+def native_str(s):
+    # bytes or text as the native str type, utf-8 encoded or decoded
+    if isinstance(s, str):
+        return s
+    return s.encode('utf-8') if str is bytes else s.decode('utf-8')
+
+def safe_name(testid):
+    # file name characters only, with no '-' and no two ids on the same name
+    return ''.join(c if c.isalnum() or c in '._' else '%%%02X'%ord(c) for c in testid)
+
+def hash_path(path, h):
+    if os.path.isdir(path):
+        for dirName, subdirList, fileList in os.walk(path):
+            subdirList.sort()
+            for filename in sorted(fileList):
+                filepath = os.path.join(dirName, filename)
+                h.update(os.path.relpath(filepath, path).encode('utf-8'))
+                hash_path(filepath, h)
+    else:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+
+def tree_size(path):
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    size = 0
+    for dirName, subdirList, fileList in os.walk(path):
+        for filename in fileList:
+            size += os.path.getsize(os.path.join(dirName, filename))
+    return size
+
+def link_tree(src, dest):
+    if not os.path.isdir(src):
+        try:
+            os.link(src, dest)
+        except OSError:
+            shutil.copy2(src, dest)
+        return
+    if not os.path.isdir(dest):
+        os.makedirs(dest)
+    for name in os.listdir(src):
+        link_tree(os.path.join(src, name), os.path.join(dest, name))
+
+def make_readonly(path):
+    mask = ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH)
+    for dirName, subdirList, fileList in os.walk(path):
+        for filename in fileList:
+            filepath = os.path.join(dirName, filename)
+            os.chmod(filepath, os.stat(filepath).st_mode & mask)
+    if not os.path.isdir(path):
+        os.chmod(path, os.stat(path).st_mode & mask)
+
+def download(url, dest, mirrors=()):
+    # a local mirror holding a file of the same name stands in for the url
+    filename = url.rstrip('/').split('/')[-1]
+    for mirror in mirrors:
+        path = os.path.join(mirror, filename)
+        if os.path.exists(path):
+            shutil.copy2(path, dest)
+            return dest
+    response = urlopen(url)
+    try:
+        with open(dest, 'wb') as f:
+            shutil.copyfileobj(response, f)
+    finally:
+        response.close()
+    return dest
+
+def remove_tree(path):
+    def onerror(func, p, exc_info):
+        os.chmod(p, stat.S_IWUSR | stat.S_IRUSR | stat.S_IXUSR)
+        func(p)
+    shutil.rmtree(path, onerror=onerror)
+
+class ArtifactCache(object):
+
+    def __init__(self, cache_dir, max_bytes=None, mirrors=()):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_bytes = max_bytes
+        self.mirrors = list(mirrors)
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+    def key(self, testid, name, *inputs):
+        # inputs are file or directory paths, or any other value hashed by
+        # repr; str, unicode and bytes inputs are hashed as the native str
+        h = hashlib.sha1()
+        h.update(name.encode('utf-8'))
+        for item in inputs:
+            if isinstance(item, (bytes, text_type)):
+                item = native_str(item)
+                if os.path.exists(item):
+                    hash_path(item, h)
+                    continue
+            h.update(repr(item).encode('utf-8'))
+        return '%s-%s-%s'%(safe_name(testid), name, h.hexdigest())
+
+    def entry(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def fetch(self, key, dest):
+        entry = self.entry(key)
+        data = os.path.join(entry, ENTRY_DATA)
+        if not os.path.exists(data):
+            return False
+        os.utime(entry, None)   # mark as recently used
+        link_tree(data, dest)
+        return True
+
+    def store(self, key, src):
+        entry = self.entry(key)
+        if os.path.exists(entry):
+            return
+        tmpdir = tempfile.mkdtemp(prefix='.tmp-', dir=self.cache_dir)
+        data = os.path.join(tmpdir, ENTRY_DATA)
+        if os.path.isdir(src):
+            shutil.copytree(src, data, symlinks=True)
+        else:
+            shutil.copy2(src, data)
+        make_readonly(data)
+        try:
+            os.rename(tmpdir, entry)
+        except OSError:
+            # another process stored the same entry first
+            remove_tree(tmpdir)
+        self.evict()
+
+    def invalidate(self, testid):
+        testname = safe_name(testid)
+        for name in os.listdir(self.cache_dir):
+            if name.split('-', 1)[0] == testname:
+                remove_tree(os.path.join(self.cache_dir, name))
+
+    def evict(self):
+        if self.max_bytes is None:
+            return
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if name.startswith('.'):
+                continue
+            entry = os.path.join(self.cache_dir, name)
+            size = tree_size(os.path.join(entry, ENTRY_DATA))
+            entries.append((os.stat(entry).st_mtime, size, entry))
+            total += size
+        for mtime, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            remove_tree(entry)
+            total -= size
+
+    def download(self, url, dest):
+        return download(url, dest, self.mirrors)
@@ -0,0 +1,60 @@
+''' Danata test run checkpoint
+
+NOTE:
+ - each finished test is appended to the checkpoint file as one JSON line with
+   its result and the hash of its inputs, and flushed to disk right away
+ - the file holds the latest record of every test that was run with it; it is
+   compacted to those when opened, so runs of other test selections sharing the
+   file don't drop each other's records
+ - a resumed run loads the checkpoint and skips the tests that passed with the
+   same inputs hash; their recorded results go into the report
+ - a line cut short by an interruption is dropped when the checkpoint is loaded
+'''
+
+import os
+import json
+from collections import OrderedDict
+
+class Checkpoint(object):
+
+    def __init__(self, path):
+        # records of tests not run this time are kept for later resumed runs
+        self.path = path
+        self.tests = OrderedDict()
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.tests[record['test']] = record
+            self._rewrite()
+        self.out = open(path, 'a')
+
+    def _rewrite(self):
+        # drops partial lines and superseded records before appending
+        tmppath = self.path + '.tmp'
+        with open(tmppath, 'w') as f:
+            for record in self.tests.values():
+                f.write(json.dumps(record, sort_keys=True) + '\n')
+        os.rename(tmppath, self.path)
+
+    def passed(self, testid, digest):
+        record = self.tests.get(testid)
+        return record is not None and record['inputs'] == digest and record['result']['general']['passed']
+
+    def result(self, testid):
+        return self.tests[testid]['result']
+
+    def write(self, testid, result, digest):
+        record = { 'test': testid, 'inputs': digest, 'result': result }
+        self.tests[testid] = record
+        self.out.write(json.dumps(record, sort_keys=True) + '\n')
+        self.out.flush()
+        os.fsync(self.out.fileno())
+
+    def close(self):
+        if self.out is not None:
+            self.out.close()
+            self.out = None
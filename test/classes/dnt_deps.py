@@ -0,0 +1,158 @@
+''' Danata test dependency index
+
+NOTE:
+ - dependencies of a test are the files of its test directory, the test scripts
+   of its parent directories, the harness classes and the Danata and test suite
+   modules of the test: those loaded while it ran (a sys.modules diff) and those
+   its test classes reach through module globals, which also finds the modules
+   an earlier test in the same process or pool worker loaded first
+ - each dependency is recorded with its mtime, size and content hash; a file is
+   changed when its mtime or size moved and its hash differs
+ - a test without a record is always treated as changed
+ - inputs_hash summarizes a set of files in one digest; the checkpoint of a test
+   run uses it on the test directory and the Danata sources
+'''
+
+import os
+import sys
+import json
+import hashlib
+from types import ModuleType, FunctionType
+
+def file_hash(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def file_state(path):
+    st = os.stat(path)
+    return [st.st_mtime, st.st_size, file_hash(path)]
+
+def module_files(root, names=None, exclude=None):
+    # files under root (and not under exclude) of the named or all loaded modules
+    root = os.path.realpath(root)
+    exclude = os.path.realpath(exclude) + os.sep if exclude else None
+    modules = sys.modules.copy()
+    files = set()
+    for name in (modules if names is None else names):
+        path = getattr(modules.get(name), '__file__', None)
+        if not path:
+            continue
+        if path.endswith(('.pyc', '.pyo')):
+            path = path[:-1]
+        path = os.path.realpath(path)
+        if exclude and path.startswith(exclude):
+            continue
+        if path.startswith(root + os.sep) and os.path.exists(path):
+            files.add(path)
+    return files
+
+def test_files(test_home, test_dir):
+    files = set()
+    for dirName, subdirList, fileList in os.walk(test_dir):
+        for filename in fileList:
+            if not filename.endswith(('.pyc', '.pyo')):
+                files.add(os.path.realpath(os.path.join(dirName, filename)))
+
+    # test scripts of parent directories and the harness classes
+    relpath = os.path.relpath(test_dir, test_home)
+    parts = relpath.split(os.sep)
+    for i in range(1, len(parts)):
+        parent = os.path.join(test_home, *parts[:i])
+        path_script = os.path.join(parent, '%s_test.py'%'_'.join(parts[:i]))
+        if os.path.exists(path_script):
+            files.add(os.path.realpath(path_script))
+    classes = os.path.join(test_home, 'classes')
+    for filename in os.listdir(classes):
+        if filename.endswith('.py'):
+            files.add(os.path.realpath(os.path.join(classes, filename)))
+    return files
+
+def referenced_modules(roots, root):
+    # names of the modules under root reachable from roots through module
+    # globals: imported modules and the modules of imported classes and functions
+    root = os.path.realpath(root) + os.sep
+    modules = sys.modules.copy()
+    names = set()
+    stack = list(roots)
+    while stack:
+        mod = stack.pop()
+        name = getattr(mod, '__name__', None)
+        path = getattr(mod, '__file__', None)
+        if name in names or not path or not os.path.realpath(path).startswith(root):
+            continue
+        names.add(name)
+        # importing a module runs the __init__ of its packages
+        stack.extend(modules.get(name[:i]) for i, c in enumerate(name) if c == '.')
+        for value in list(vars(mod).values()):
+            if isinstance(value, ModuleType):
+                stack.append(value)
+            elif isinstance(value, (type, FunctionType)):
+                stack.append(modules.get(value.__module__))
+    return names
+
+def collect_deps(dnt_home, test_home, test_dir, loaded, roots):
+    # loaded: names of the modules loaded before the test; roots: the modules
+    # of its test classes
+    loaded = set(loaded)
+    names = set(name for name in sys.modules.copy() if name not in loaded)
+    names.update(referenced_modules(roots + [ sys.modules.get(name) for name in names ], dnt_home))
+    return sorted(module_files(dnt_home, names) | test_files(test_home, test_dir))
+
+def source_files(dnt_home, test_home):
+    # Danata python sources, not including the test suite
+    dnt_home, test_home = os.path.realpath(dnt_home), os.path.realpath(test_home)
+    files = set()
+    for dirName, subdirList, fileList in os.walk(dnt_home):
+        subdirList[:] = [ name for name in subdirList if not name.startswith('.') and
+            os.path.join(dirName, name) != test_home ]
+        for filename in fileList:
+            if filename.endswith('.py'):
+                files.add(os.path.join(dirName, filename))
+    return files
+
+def inputs_hash(files, root):
+    # hash of file contents keyed by their path relative to root
+    h = hashlib.sha1()
+    for path in sorted(files):
+        h.update(os.path.relpath(path, root).encode('utf-8'))
+        h.update(file_hash(path).encode('utf-8'))
+    return h.hexdigest()
+
+class DependencyIndex(object):
+
+    def __init__(self, path):
+        self.path = path
+        self.tests = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.tests = json.load(f)
+
+    def record(self, testid, files):
+        deps = {}
+        for path in files:
+            if os.path.exists(path):
+                deps[path] = file_state(path)
+        self.tests[testid] = deps
+
+    def changed(self, testid):
+        deps = self.tests.get(testid)
+        if deps is None:
+            return True
+        for path, (mtime, size, digest) in deps.items():
+            if not os.path.exists(path):
+                return True
+            st = os.stat(path)
+            if st.st_mtime == mtime and st.st_size == size:
+                continue
+            if st.st_size != size or file_hash(path) != digest:
+                return True
+        return False
+
+    def save(self):
+        tmppath = self.path + '.tmp'
+        with open(tmppath, 'w') as f:
+            json.dump(self.tests, f, sort_keys=True)
+        os.rename(tmppath, self.path)
@@ -0,0 +1,106 @@
+''' Danata streaming result writers
+
+NOTE:
+ - a writer receives each test result as soon as the test finishes
+ - formatting and file output happen in a background thread that drains a
+   queue, so the test run does not wait on the disk; the file is flushed
+   whenever the queue runs empty
+ - close() writes out every queued result before returning
+'''
+
+import json
+import threading
+from xml.sax.saxutils import escape, quoteattr
+
+try:
+    from Queue import Queue
+except ImportError:
+    from queue import Queue
+
+from dnt_test import DntTest, TIMING_KEYS
+
+STATUS_NAMES = { DntTest.NOT_EXECUTED: 'NOT_EXECUTED', DntTest.FAILED: 'FAILED', DntTest.PASSED: 'PASSED' }
+
+def task_results(result):
+    tasks = []
+    for taskname, taskresult in result.items():
+        if taskname == 'general' or not isinstance(taskresult, dict):
+            continue
+        task = { 'name': taskname, 'status': STATUS_NAMES.get(taskresult.get('status'), taskresult.get('status')),
+            'errmsg': taskresult.get('errmsg', '') }
+        for key in TIMING_KEYS:
+            task[key] = taskresult.get(key, 0)
+        tasks.append(task)
+    return tasks
+
+class ResultWriter(object):
+
+    def __init__(self, path):
+        self.path = path
+        self.out = open(path, 'w')
+        self.queue = Queue()
+        self.thread = threading.Thread(target=self._drain)
+        self.thread.daemon = True
+        self.out.write(self.header())
+        self.out.flush()
+        self.thread.start()
+
+    def write(self, testid, result):
+        self.queue.put((testid, result))
+
+    def close(self):
+        if self.out is None:
+            return
+        self.queue.put(None)
+        self.thread.join()
+        self.out.write(self.footer())
+        self.out.close()
+        self.out = None
+
+    def _drain(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            self.out.write(self.format(*item))
+            if self.queue.empty():
+                self.out.flush()
+
+    def header(self):
+        return ''
+
+    def footer(self):
+        return ''
+
+    def format(self, testid, result):
+        raise NotImplementedError()
+
+class JsonLinesWriter(ResultWriter):
+
+    def format(self, testid, result):
+        general = result['general']
+        record = { 'test': testid, 'passed': general['passed'], 'errmsg': general['errmsg'],
+            'wall_time': general.get('wall_time', 0), 'tasks': task_results(result), 'result': result }
+        return json.dumps(record, sort_keys=True) + '\n'
+
+class JUnitXmlWriter(ResultWriter):
+
+    def header(self):
+        return '<?xml version="1.0" encoding="UTF-8"?>\n<testsuite name="danata">\n'
+
+    def footer(self):
+        return '</testsuite>\n'
+
+    def format(self, testid, result):
+        general = result['general']
+        classname, _, name = testid.rpartition('/')
+        lines = [ '  <testcase classname=%s name=%s time="%.6f">'%(quoteattr(classname.replace('/', '.')),
+            quoteattr(name), general.get('wall_time', 0)) ]
+        if not general['passed']:
+            message = '; '.join(general['errmsg'])
+            lines.append('    <failure message=%s>%s</failure>'%(quoteattr(message), escape(message)))
+        tasklines = [ '%s %s %.6fs %s'%(task['name'], task['status'], task['wall_time'], task['errmsg'])
+            for task in task_results(result) ]
+        lines.append('    <system-out>%s</system-out>'%escape('\n'.join(tasklines)))
+        lines.append('  </testcase>\n')
+        return '\n'.join(lines)
@@ -0,0 +1,92 @@
+''' Danata test sharding
+
+NOTE:
+ - tests are split into shards by longest processing time first: the slowest
+   test goes to the least loaded shard, ties broken by test id and shard number,
+   so every node computes the same partition from the same test list and timings
+ - runtimes come from an optional timing database; a test without a recorded
+   runtime is estimated by the median of the recorded ones
+ - shards write JSON lines results (--json) that are merged into one report;
+   a shard run leaves the timing database as it is, so that all nodes keep
+   partitioning with the same timings, and the merge records the new runtimes
+'''
+
+import os
+import json
+from collections import OrderedDict
+
+def parse_shard(text):
+    # 'i/N' with 1 <= i <= N
+    try:
+        index, count = [ int(part) for part in text.split('/') ]
+    except ValueError:
+        raise ValueError('Shard should be given as i/N: %s'%text)
+    if count < 1 or index < 1 or index > count:
+        raise ValueError('Shard index is out of range: %s'%text)
+    return index, count
+
+def median(values):
+    s = sorted(values)
+    if not s:
+        return None
+    mid = len(s) // 2
+    return s[mid] if len(s) % 2 else (s[mid-1] + s[mid]) / 2.0
+
+class TimingDB(object):
+
+    def __init__(self, path):
+        self.path = path
+        self.timings = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.timings = json.load(f)
+            except (IOError, OSError, ValueError):
+                self.timings = {}
+
+    def record(self, testid, result):
+        wall_time = result['general'].get('wall_time')
+        if wall_time:
+            self.timings[testid] = wall_time
+
+    def estimate(self, testids):
+        default = median(self.timings.values()) or 1.0
+        return [ self.timings.get(testid, default) for testid in testids ]
+
+    def save(self):
+        if not self.path:
+            return
+        tmppath = self.path + '.tmp'
+        try:
+            with open(tmppath, 'w') as f:
+                json.dump(self.timings, f, sort_keys=True, indent=0)
+            os.rename(tmppath, self.path)
+        except (IOError, OSError):
+            pass
+
+def partition(testids, weights, count):
+    # returns a list of index lists into testids, one per shard
+    shards = [ [] for _ in range(count) ]
+    loads = [ 0.0 ] * count
+    order = sorted(range(len(testids)), key=lambda i: (-weights[i], testids[i]))
+    for i in order:
+        ishard = min(range(count), key=lambda j: (loads[j], j))
+        shards[ishard].append(i)
+        loads[ishard] += weights[i]
+    return [ sorted(shard) for shard in shards ]
+
+def select_shard(tests, testids, timingdb, index, count):
+    shards = partition(testids, timingdb.estimate(testids), count)
+    return [ tests[i] for i in shards[index-1] ]
+
+def load_results(paths):
+    # a later result of the same test overrides an earlier one
+    testDB = OrderedDict()
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    record = json.loads(line)
+                    testDB[record['test']] = record['result']
+    return testDB
@@ -1,11 +1,41 @@
 ''' Danata test classes '''
 
 from __future__ import print_function
+import os
 import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+TIMING_KEYS = ('wall_time', 'cpu_time', 'rss_growth', 'traced_peak')
+
+def cpu_time():
+    # user and system time of this process and its finished children
+    t = os.times()
+    return t[0] + t[1] + t[2] + t[3]
+
+def peak_rss():
+    # peak resident set sizes in KB of this process and of its largest finished child
+    if resource is None:
+        return 0, 0
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
 
 class DntTest(object):
     (NOT_EXECUTED, FAILED, PASSED) = range(3)
     TEST_NUM = 0
+    PROFILE_TASKS = []
+    PROFILE_DIR = None
+    TIMED_TASKS = ['read_task', 'xform_task', 'write_task']
+    CACHE = None
 
     def get_tasks(self):
         for taskname, taskfunc in self.task_map:
@@ -38,6 +68,9 @@ class DntTest(object):
             result[taskname] = {}
             result[taskname]['status'] = self.NOT_EXECUTED
             result[taskname]['errmsg'] = ''
+            for key in TIMING_KEYS:
+                result[taskname][key] = 0
+        test_start = time.time()
 
         for taskname, taskfunc in self.task_map:
             print('.', end='')
@@ -48,7 +81,7 @@ class DntTest(object):
                 continue
             result['goto'] = None
 
-            result = taskfunc(taskname, result)
+            result = self.run_task(taskname, taskfunc, result)
 
             is_passed = True
             if taskname in result['general']['mandatory_tasks']:
@@ -69,8 +102,65 @@ class DntTest(object):
                 print ('Test is stopped at', taskname)
                 break
 
+        result['general']['wall_time'] = time.time() - test_start
         return result
 
+    def run_task(self, taskname, taskfunc, result):
+        # peaks are high-water marks of the process; a task is charged with how
+        # far it raised them. Python heap peaks are traced for profiled tasks
+        # (Python 3.4+)
+        profiled = taskname in self.PROFILE_TASKS
+        tracing = tracemalloc is not None and (profiled or tracemalloc.is_tracing())
+        started = tracing and not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        elif tracing and hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        traced0 = tracemalloc.get_traced_memory()[0] if tracing else 0
+        rss0 = peak_rss()
+        wall0, cpu0 = time.time(), cpu_time()
+
+        if profiled:
+            import cProfile
+            profiler = cProfile.Profile()
+            result = profiler.runcall(taskfunc, taskname, result)
+            profdir = self.PROFILE_DIR or os.getcwd()
+            if not os.path.isdir(profdir):
+                os.makedirs(profdir)
+            profiler.dump_stats(os.path.join(profdir, '%s.%s.pstats'%
+                (self.TEST_ID.replace('/', '_'), taskname)))
+        else:
+            result = taskfunc(taskname, result)
+
+        timing = result[taskname]
+        timing['wall_time'] = time.time() - wall0
+        timing['cpu_time'] = cpu_time() - cpu0
+        timing['rss_growth'] = max(0, *[ rss - base for rss, base in zip(peak_rss(), rss0) ])
+        if tracing:
+            timing['traced_peak'] = tracemalloc.get_traced_memory()[1] - traced0
+            if started:
+                tracemalloc.stop()
+        return result
+
+    def cached_artifact(self, name, inputs, dest, produce):
+        # produce(dest) builds the artifact; returns True on a cache hit
+        if self.CACHE is None:
+            produce(dest)
+            return False
+        key = self.CACHE.key(self.TEST_ID, name, *inputs)
+        if self.CACHE.fetch(key, dest):
+            return True
+        produce(dest)
+        self.CACHE.store(key, dest)
+        return False
+
+    def fetch_url(self, url, dest):
+        if self.CACHE is None:
+            from dnt_cache import download
+            return download(url, dest)
+        self.cached_artifact('download', [url], dest, lambda path: self.CACHE.download(url, path))
+        return dest
+
     def preprocess(self, myname, result):
         self.set_status(result, myname, self.NOT_EXECUTED)
         return result
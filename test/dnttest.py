@@ -3,9 +3,19 @@
 from __future__ import print_function
 
 import os
+import re
 import sys
+import json
+import shutil
 import signal
 import inspect
+import tempfile
+import traceback
+import multiprocessing
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
 
 # Python version check
 if sys.hexversion < 0x020700F0:
@@ -16,8 +26,20 @@ SCRIPT_HOME, SCRIPT_NAME = os.path.split(os.path.realpath(__file__))
 DNT_HOME = '%s/..'%SCRIPT_HOME
 sys.path.insert(0, DNT_HOME)
 TEST_SCRIPT = 'runtest.py'
+NSLOWEST = 5
+DEPS_INDEX = '.dnt_deps.json'
+DISCOVERY_INDEX = '.dnt_discovery.json'
+TIMING_DB = '.dnt_timings.json'
+CHECKPOINT = '.dnt_checkpoint.jsonl'
+POLL_INTERVAL = 0.5
 
 from classes import DntTest
+from classes import dnt_bench
+from classes.dnt_cache import ArtifactCache
+from classes.dnt_deps import DependencyIndex, collect_deps, source_files, test_files, inputs_hash
+from classes.dnt_checkpoint import Checkpoint
+from classes.dnt_report import JsonLinesWriter, JUnitXmlWriter
+from classes import dnt_shard
 from collections import OrderedDict
 
 def report(testDB):
@@ -40,17 +62,295 @@ def report(testDB):
             print( '%s : FAILED'%testid )
             print( 'ERROR MSG:', result['general']['errmsg'] )
             print( '' )
-    
+
+    timed = [ (result['general'].get('wall_time', 0), testid) for testid, result in testDB.iteritems() ]
+    if any(t for t, testid in timed):
+        print( 'Slowest tests:' )
+        for t, testid in sorted(timed, reverse=True)[:NSLOWEST]:
+            print( '  %10.3f s  %s'%(t, testid) )
+        print( '' )
+
+        tasks = [ (taskresult['wall_time'], taskresult.get('cpu_time', 0), taskresult.get('rss_growth', 0), testid, taskname)
+            for testid, result in testDB.iteritems() for taskname, taskresult in result.items()
+            if taskname != 'general' and isinstance(taskresult, dict) and taskresult.get('wall_time') ]
+        print( 'Slowest tasks:          wall(s)      cpu(s)    rss+(KB)' )
+        for wall, cpu, rss, testid, taskname in sorted(tasks, reverse=True)[:NSLOWEST]:
+            print( '  %-20s %10.3f  %10.3f  %10d  %s'%(taskname, wall, cpu, rss, testid) )
+        print( '' )
+
     print( '***********************************' )
 
 
+def load_source(modname, path):
+    if modname in sys.modules:
+        return sys.modules[modname]
+    try:
+        from importlib.util import spec_from_file_location, module_from_spec
+    except ImportError:
+        import imp
+        return imp.load_source(modname, path)
+    spec = spec_from_file_location(modname, path)
+    mod = module_from_spec(spec)
+    sys.modules[modname] = mod
+    try:
+        spec.loader.exec_module(mod)
+    except Exception:
+        del sys.modules[modname]
+        raise
+    return mod
+
+def load_test_module(relpath, dirName):
+    # runtest modules import the test scripts of their directory and its parents by name
+    # the name of test script is fixed according to relative path to SCRIPT HOME
+    parts = relpath.split(os.sep)
+    for i in range(1, len(parts)+1):
+        path_script = '%s_test'%'_'.join(parts[:i])
+        path = os.path.join(SCRIPT_HOME, os.sep.join(parts[:i]), path_script+'.py')
+        if path_script not in sys.modules and os.path.exists(path):
+            load_source(path_script, path)
+
+    # a unique module name for each runtest module
+    modname = 'dnt_runtest_%s'%re.sub(r'\W', '_', relpath)
+    return load_source(modname, os.path.join(dirName, TEST_SCRIPT))
+
+def match_test(x):
+    return inspect.isclass(x) and issubclass(x, DntTest) and x is not DntTest and len(x.__subclasses__())==0
+
+def walk_tests(index):
+    # yields (relpath, dirName, entry); entry caches the listing of a directory
+    # and is reused as long as the directory mtime does not change
+    stack = [os.curdir]
+    while stack:
+        relpath = stack.pop()
+        dirName = os.path.normpath(os.path.join(SCRIPT_HOME, relpath))
+        mtime = os.stat(dirName).st_mtime
+        entry = index.get(relpath)
+        if entry is None or entry['mtime'] != mtime:
+            names = os.listdir(dirName)
+            subdirs = [ name for name in names if os.path.isdir(os.path.join(dirName, name)) and
+                not name.startswith('.') and name != '__pycache__' ]
+            entry = { 'mtime': mtime, 'dirs': sorted(subdirs), 'script': TEST_SCRIPT in names }
+            index[relpath] = entry
+
+        yield relpath, dirName, entry
+
+        for subdir in reversed(entry['dirs']):
+            subpath = os.path.normpath(os.path.join(relpath, subdir))
+            if subpath.startswith('packages') or subpath.startswith('classes'): continue
+            stack.append(subpath)
+
+def discover(args):
+    tests = []
+
+    indexpath = os.path.join(SCRIPT_HOME, DISCOVERY_INDEX)
+    try:
+        with open(indexpath) as f:
+            index = json.load(f)
+    except (IOError, OSError, ValueError):
+        index = {}
+    oldindex = json.dumps(index, sort_keys=True)
+
+    for relpath, dirName, entry in walk_tests(index):
+        if args.tests:
+            if all(not relpath.startswith(argtest.rstrip(' /')) for argtest in args.tests) and \
+                all(not argtest.startswith(relpath) for argtest in args.tests):
+                continue
+
+        # if TEST_SCRIPT exists in a directory
+        if entry['script']:
+            script_mtime = os.stat(os.path.join(dirName, TEST_SCRIPT)).st_mtime
+            if entry.get('script_mtime') != script_mtime:
+                mod = load_test_module(relpath, dirName)
+
+                # find classes inherited from DntTest class
+                entry['tests'] = [ name for name, cls in inspect.getmembers(mod, match_test) ]
+                entry['script_mtime'] = script_mtime
+
+            for name in entry['tests']:
+                tests.append((relpath, dirName, name))
+
+    if json.dumps(index, sort_keys=True) != oldindex:
+        try:
+            with open(indexpath, 'w') as f:
+                json.dump(index, f, sort_keys=True)
+        except (IOError, OSError):
+            pass
+
+    return tests
+
+def test_id(test):
+    relpath, dirName, name = test
+    return '%s/%s'%(relpath, name)
+
+def create_test(cls, relpath, dirName, name, args):
+    obj = cls()
+    obj.DNT_HOME = DNT_HOME
+    obj.WORK_DIR = args.work_dir
+    obj.TEST_HOME = SCRIPT_HOME
+    obj.TEST_SCRIPT = TEST_SCRIPT
+    obj.TEST_DIR = dirName
+    obj.TEST_NUM += 1
+    obj.TEST_ID = test_id((relpath, dirName, name))
+    obj.LEAVE_TEMP = args.leavetemp
+    obj.REBUILD = args.rebuild
+    obj.STOP_AT = args.stop_at
+    obj.PROFILE_TASKS = [ task.strip() for task in args.profile.split(',') if task.strip() ]
+    obj.PROFILE_DIR = args.work_dir
+
+    if args.cache_dir:
+        max_bytes = int(args.cache_size * 1024 * 1024) if args.cache_size else None
+        obj.CACHE = ArtifactCache(args.cache_dir, max_bytes, args.mirrors)
+        # rebuilding means not trusting cached artifacts of this test
+        if args.rebuild:
+            obj.CACHE.invalidate(obj.TEST_ID)
+
+    # each parallel test gets its own working directory; a temporary one
+    # without -w
+    if args.jobs > 1:
+        if args.work_dir:
+            obj.WORK_DIR = os.path.join(args.work_dir, obj.TEST_ID.replace('/', '_'))
+            if not os.path.isdir(obj.WORK_DIR):
+                os.makedirs(obj.WORK_DIR)
+        else:
+            obj.WORK_DIR = tempfile.mkdtemp(prefix='dnt_%s_' % obj.TEST_ID.replace('/', '_'))
+
+    obj.OPTIONS = {}
+    if args.user_options:
+        options = [ opt.split('=') for opt in args.user_options.split(',') ]
+        for key, value in options:
+            obj.OPTIONS[key] = value
+    return obj
+
+def remove_work_dir(obj, args):
+    # the temporary working directory of a parallel test run without -w
+    if args.jobs > 1 and not args.work_dir and not args.leavetemp:
+        shutil.rmtree(obj.WORK_DIR, ignore_errors=True)
+
+def run_test(test, args, cls=None):
+    relpath, dirName, name = test
+    loaded = list(sys.modules)
+    if cls is None:
+        cls = getattr(load_test_module(relpath, dirName), name)
+
+    # process module level preparation
+    print('Testing %s: ' % relpath, end='')
+    sys.stdout.flush()
+
+    #  generate test object
+    try:
+        obj = create_test(cls, relpath, dirName, name, args)
+
+        # process class level preparation
+        #obj.configure_test()
+        try:
+            result = obj.perform_test()
+        finally:
+            remove_work_dir(obj, args)
+        return obj.TEST_ID, result, collect_deps(DNT_HOME, SCRIPT_HOME, dirName, loaded,
+            [ sys.modules[c.__module__] for c in cls.__mro__ if c.__module__ in sys.modules ])
+    except Exception as e:
+        print('FAILED: %s'%str(e))
+        raise
+
+def run_benchmark(test, args):
+    relpath, dirName, name = test
+    cls = getattr(load_test_module(relpath, dirName), name)
+
+    print('Benchmarking %s: ' % relpath, end='')
+    sys.stdout.flush()
+
+    samples = OrderedDict()
+    for irun in range(args.warmup + args.bench):
+        obj = create_test(cls, relpath, dirName, name, args)
+        stdout, sys.stdout = sys.stdout, StringIO()
+        try:
+            result = obj.perform_test()
+        finally:
+            sys.stdout = stdout
+            remove_work_dir(obj, args)
+        print('.', end='')
+        sys.stdout.flush()
+
+        if not result['general']['passed']:
+            # the tasks after the failure were not timed; no records for the test
+            print('FAILED (run %d of %d, no timings recorded)' % (irun + 1, args.warmup + args.bench))
+            return obj.TEST_ID, result, []
+        if irun < args.warmup: continue
+        for taskname in obj.TIMED_TASKS:
+            samples.setdefault(taskname, []).append(result[taskname]['wall_time'])
+        samples.setdefault('total', []).append(result['general']['wall_time'])
+
+    print('PASSED')
+    records = dnt_bench.bench_records(obj.TEST_ID, samples, obj.OPTIONS, args.bench, args.warmup)
+    return obj.TEST_ID, result, records
+
+def init_worker():
+    # interrupts are handled by the parent process
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def wait_results(results, count):
+    # a wait without a timeout defers SIGINT (and so signal_handler) until it
+    # returns on Python 2
+    for _ in range(count):
+        while True:
+            try:
+                result = results.next(timeout=POLL_INTERVAL)
+                break
+            except multiprocessing.TimeoutError:
+                pass
+        yield result
+
+def run_test_buffered(job):
+    test, args = job
+    stdout = sys.stdout
+    sys.stdout = buf = StringIO()
+    try:
+        testid, result, deps = run_test(test, args)
+        return testid, result, deps, buf.getvalue(), None
+    except Exception:
+        return None, None, None, buf.getvalue(), traceback.format_exc()
+    finally:
+        sys.stdout = stdout
+
 def main():
     # search through test subdirectories
     import argparse
 
     testDB = OrderedDict()
+    pool = []
+    depindex = DependencyIndex(os.path.join(SCRIPT_HOME, DEPS_INDEX))
+    writers = []
+    timingdb = None
+    shard = None
+    checkpoint = None
+    digests = {}
+
+    def add_result(testid, result, deps=None):
+        testDB[testid] = result
+        if shard is None:
+            # shards keep the timings they were partitioned with; --merge records them
+            timingdb.record(testid, result)
+        if deps is not None:
+            depindex.record(testid, deps)
+        for writer in writers:
+            writer.write(testid, result)
+        if checkpoint is not None and testid in digests:
+            checkpoint.write(testid, result, digests[testid])
+
+    def finish():
+        depindex.save()
+        if shard is None:
+            timingdb.save()
+        for writer in writers:
+            writer.close()
+        if checkpoint is not None:
+            checkpoint.close()
 
     def signal_handler(signal, frame):
+        for p in pool:
+            p.terminate()
+        if timingdb is not None:
+            finish()
         report(testDB)
         sys.exit(0)
 
@@ -58,96 +358,122 @@ def main():
 
     parser = argparse.ArgumentParser(description='Perform Danata tests.')
     parser.add_argument('tests', type=str, nargs='*', help='Specify tests.')
-    parser.add_argument('-c', dest='changed', action='store_true', default=False, help='Changed test only.')
+    parser.add_argument('-c', dest='changed', action='store_true', default=False, help='Changed test only: tests whose files or Danata modules changed since their last run.')
     parser.add_argument('-t', dest='leavetemp', action='store_true', default=False, help='Leave temporary directory.')
-    parser.add_argument('-r', dest='rebuild', action='store_true', default=False, help='Rebuild target software.')
+    parser.add_argument('-r', dest='rebuild', action='store_true', default=False, help='Rebuild target software (invalidates cached artifacts).')
     parser.add_argument('-w', dest='work_dir', type=str, default=None, help='Set working directory.')
     parser.add_argument('-o', dest='user_options', type=str, default='', help='User-specific options.')
     parser.add_argument('-s', dest='stop_at', type=str, default='', help='Stop test')
+    parser.add_argument('-p', dest='profile', type=str, default='', help='Profile tasks (comma-separated task names).')
+    parser.add_argument('--cache-dir', dest='cache_dir', type=str, default=os.environ.get('DNT_CACHE_DIR'), help='Artifact cache directory.')
+    parser.add_argument('--cache-size', dest='cache_size', type=float, default=None, help='Artifact cache size limit in MB.')
+    parser.add_argument('--mirror', dest='mirrors', action='append', default=[], help='Local mirror directory for downloads.')
+    parser.add_argument('--json', dest='json_out', type=str, default=None, help='Stream results to a JSON lines file.')
+    parser.add_argument('--junit', dest='junit_out', type=str, default=None, help='Stream results to a JUnit XML file.')
+    parser.add_argument('--shard', dest='shard', type=str, default=None, help='Run the i-th of N shards balanced by recorded runtimes (i/N, 1 <= i <= N).')
+    parser.add_argument('--timing-db', dest='timing_db', type=str, default=os.path.join(SCRIPT_HOME, TIMING_DB), help='Timing database of test runtimes used for sharding.')
+    parser.add_argument('--merge', dest='merge', type=str, nargs='+', default=None, help='Merge JSON lines results of shards into one report.')
+    parser.add_argument('--resume', dest='resume', action='store_true', default=False, help='Skip tests that passed in the checkpoint with unchanged inputs.')
+    parser.add_argument('--checkpoint', dest='checkpoint', type=str, default=os.path.join(SCRIPT_HOME, CHECKPOINT), help='Checkpoint file of test results.')
+    parser.add_argument('-j', dest='jobs', type=int, default=1, help='Number of tests run in parallel.')
+    parser.add_argument('-b', dest='bench', type=int, default=0, help='Benchmark: number of timed runs per test. Select the size with -o.')
+    parser.add_argument('--warmup', dest='warmup', type=int, default=1, help='Benchmark: number of untimed warm-up runs.')
+    parser.add_argument('--bench-out', dest='bench_out', type=str, default=None, help='Benchmark: JSON lines file to append results.')
+    parser.add_argument('--baseline', dest='baseline', type=str, default=None, help='Benchmark: JSON lines file to compare against.')
+    parser.add_argument('--threshold', dest='threshold', type=float, default=0.1, help='Benchmark: flag tasks slower than baseline by this fraction.')
 
     # parse command line arguments
     args = parser.parse_args()
 
-    # walk through test directory tree
-    for dirName, subdirList, fileList in os.walk(SCRIPT_HOME):
-        relpath = os.path.relpath(dirName, SCRIPT_HOME)
-        if relpath.startswith('packages'): continue
-        if relpath.startswith('classes'):
-            del subdirList[:]
-            continue
+    timingdb = dnt_shard.TimingDB(args.timing_db)
 
-        if args.tests:
-            if all(not relpath.startswith(argtest.rstrip(' /')) for argtest in args.tests) and \
-                all(not argtest.startswith(relpath) for argtest in args.tests):
-                continue
+    if args.merge:
+        testDB.update(dnt_shard.load_results(args.merge))
+        for testid, result in testDB.items():
+            timingdb.record(testid, result)
+        timingdb.save()
+        report(testDB)
+        return
 
-        # if dnt test script exists in a directory
-        # the name of test script is fixed according to relative path to SCRIPT HOME
-        path_script = '%s_test.py'%relpath.replace('/', '_')
-        if path_script in fileList and dirName != SCRIPT_HOME:
-            pathsave = sys.path[:]
-            sys.path.insert(0, dirName)
-            mod = __import__(path_script[:-3])
+    if args.shard:
+        try:
+            shard = dnt_shard.parse_shard(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
 
-            test_found = False
+    if args.json_out:
+        writers.append(JsonLinesWriter(args.json_out))
+    if args.junit_out:
+        writers.append(JUnitXmlWriter(args.junit_out))
 
-            # find classes inherited from DntTest class
-            match = lambda x: inspect.isclass(x) and issubclass(x, DntTest) and x is not DntTest
-            for name, cls in inspect.getmembers(mod, match):
-                test_found = True
-                break
-            #if not test_found: sys.path = pathsave
-            sys.path = pathsave
+    tests = discover(args)
+    if shard:
+        tests = dnt_shard.select_shard(tests, [ test_id(test) for test in tests ], timingdb, *shard)
+    if args.changed:
+        tests = [ test for test in tests if depindex.changed(test_id(test)) ]
 
-        # if TEST_SCRIPT exists in a directory
-        if TEST_SCRIPT in fileList:
-            pathsave = sys.path[:]
-            sys.path.insert(0, dirName)
-
-            # reload module in different path
-            modname = TEST_SCRIPT[:-3]
-            if modname in sys.modules:
-                del sys.modules[modname]
-            mod = __import__(modname)
-
-            test_found = False
-
-            # find classes inherited from DntTest class
-            match = lambda x: inspect.isclass(x) and issubclass(x, DntTest) and x is not DntTest and len(x.__subclasses__())==0
-            for name, cls in inspect.getmembers(mod, match):
-                # process module level preparation
-                print('Testing %s: ' % relpath, end='')
-                sys.stdout.flush()
-
-                #  generate test object
-                try:
-                    obj = cls()
-                    obj.DNT_HOME = DNT_HOME
-                    obj.WORK_DIR = args.work_dir
-                    obj.TEST_HOME = SCRIPT_HOME
-                    obj.TEST_SCRIPT = TEST_SCRIPT
-                    obj.TEST_DIR = dirName
-                    obj.TEST_NUM += 1
-                    obj.TEST_ID = '%s/%s'%(relpath, name)
-                    obj.LEAVE_TEMP = args.leavetemp
-                    obj.REBUILD = args.rebuild
-                    obj.STOP_AT = args.stop_at
-
-                    obj.OPTIONS = {}
-                    if args.user_options:
-                        options = [ opt.split('=') for opt in args.user_options.split(',') ]
-                        for key, value in options:
-                            obj.OPTIONS[key] = value
-
-                    # process class level preparation
-                    #obj.configure_test()
-                    testDB[obj.TEST_ID] = obj.perform_test()
-                except Exception as e:
-                    print('FAILED: %s'%str(e))
-                    raise
-            
-            sys.path = pathsave
+    if args.bench == 0:
+        # inputs of a test are its test directory and the Danata sources
+        checkpoint = Checkpoint(args.checkpoint)
+        sources = inputs_hash(source_files(DNT_HOME, SCRIPT_HOME), DNT_HOME)
+        for relpath, dirName, name in tests:
+            digests[test_id((relpath, dirName, name))] = '%s-%s'%(sources,
+                inputs_hash(test_files(SCRIPT_HOME, dirName), SCRIPT_HOME))
+        if args.resume:
+            resumed = [ test for test in tests if checkpoint.passed(test_id(test), digests[test_id(test)]) ]
+            for test in resumed:
+                # the checkpoint already holds it; reports and timings get it again
+                del digests[test_id(test)]
+                add_result(test_id(test), checkpoint.result(test_id(test)))
+            tests = [ test for test in tests if test_id(test) not in testDB ]
+            print('Resumed: %d passed tests are skipped.'%len(resumed))
+
+    if args.bench > 0:
+        # the baseline may be the file the records are appended to, so it is
+        # read before they are
+        baseline = dnt_bench.load_baseline(args.baseline) if args.baseline else None
+        # benchmarks run one at a time to keep timings comparable
+        records = []
+        for test in tests:
+            testid, result, bench = run_benchmark(test, args)
+            add_result(testid, result)
+            records.extend(bench)
+
+        finish()
+        report(testDB)
+
+        bench_out = args.bench_out or os.path.join(args.work_dir or os.getcwd(), 'dnt_bench.jsonl')
+        dnt_bench.write_records(bench_out, records)
+        regressions = []
+        if baseline is not None:
+            regressions = dnt_bench.compare(records, baseline, args.threshold)
+        dnt_bench.print_bench(records, regressions)
+        if regressions:
+            sys.exit(1)
+        return
+
+    if args.jobs > 1:
+        mp = multiprocessing.Pool(args.jobs, init_worker)
+        pool.append(mp)
+        jobs = [ (test, args) for test in tests ]
+        results = mp.imap_unordered(run_test_buffered, jobs)
+        for testid, result, deps, output, error in wait_results(results, len(jobs)):
+            # print whole output of a test at once
+            sys.stdout.write(output)
+            sys.stdout.flush()
+            if error:
+                mp.terminate()
+                raise Exception(error)
+            add_result(testid, result, deps)
+        mp.close()
+        mp.join()
+        del pool[:]
+    else:
+        for test in tests:
+            testid, result, deps = run_test(test, args)
+            add_result(testid, result, deps)
 
+    finish()
     report(testDB)
 
 if __name__ == "__main__":